@@ -4,8 +4,9 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlmodel import Session, select
-from database import get_session
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from database import get_async_session
 from models import User
 
 # TODO: Move to .env in production
@@ -39,7 +40,7 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], session: Session = Depends(get_session)):
+async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], session: AsyncSession = Depends(get_async_session)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -57,7 +58,7 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], sessio
     try:
         from models import Usuario
         statement_usuario = select(Usuario).where(Usuario.nombre == email)
-        user_usuario = session.exec(statement_usuario).first()
+        user_usuario = (await session.exec(statement_usuario)).first()
         if user_usuario:
              return user_usuario
     except Exception as e:
@@ -0,0 +1,109 @@
+import os
+import sys
+import json
+from utils import basel_index
+
+# Benchmark: Basel code ranking against hand-labelled registry descriptions,
+# then the /analyze fast path (basel_index.confident_rank) over a grid of
+# threshold/margin settings: hit rate = share of queries that skip the LLM
+# identification pass, precision = share of those whose top code is right.
+# Usage: python bench_basel.py [k]
+# Reads basel_catalog.json directly, no database needed. Exits non-zero when one
+# of the MUST_RANK_FIRST queries (entries that exclude the query's material
+# used to outrank the right code) loses its first place again.
+BASEL_MIN_SCORE = float(os.getenv("BASEL_MIN_SCORE", "0.1"))
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "basel_catalog.json")
+
+# (query, acceptable codes)
+LABELLED = [
+    ("Baterías plomo-ácido", {"A1160"}),
+    ("Baterías plomo-ácido usadas de camiones", {"A1160"}),
+    ("Acumuladores de plomo", {"A1160"}),
+    ("Pilas alcalinas usadas", {"B1090"}),
+    ("Aceite lubricante usado", {"A3020"}),
+    ("Aceite hidráulico usado", {"A3020"}),
+    ("Residuos de aceite mineral de motores", {"A3020"}),
+    ("Aceite de cocina usado del comedor", {"B3065"}),
+    ("Mezcla de agua con hidrocarburos del lavadero", {"A4060"}),
+    ("Aceite dieléctrico de transformadores con PCB", {"A3180"}),
+    ("Neumáticos fuera de uso", {"B3140"}),
+    ("Llantas usadas de camiones mineros", {"B3140"}),
+    ("Residuos de aparatos eléctricos y electrónicos con baterías", {"A1180"}),
+    ("Fluorescentes con mercurio", {"A1030", "A1180"}),
+    ("Tubos de rayos catódicos de monitores", {"A2010"}),
+    ("Residuos de amianto de tuberías", {"A2050"}),
+    ("Envases de productos químicos contaminados", {"A4130"}),
+    ("Residuos clínicos del tópico médico", {"A4020"}),
+    ("Residuos de pinturas y barnices", {"A4070", "B4010"}),
+    ("Solventes orgánicos halogenados usados", {"A3150"}),
+    ("Carbón activado consumido de planta ADR", {"A4160", "B2060"}),
+    ("Escoria de fundición de hierro y acero", {"B1200", "B1210"}),
+    ("Cables de cobre recubiertos con plástico", {"B1115", "A1190"}),
+    ("Cenizas de incineración de cables de cobre", {"A1090"}),
+    ("Chatarra de metal limpia", {"B1020"}),
+    ("Residuos de plástico PET y polietileno", {"B3010"}),
+    ("Papel y cartón de oficina", {"B3020"}),
+    ("Madera de embalaje y pallets", {"B3050"}),
+    ("Residuos de caucho de fajas transportadoras", {"B3040", "B3080"}),
+    ("Catalizadores agotados", {"B1120", "B1130", "A2030"}),
+    ("Cianuro de sodio residual", {"A4050"}),
+    ("Soluciones ácidas residuales", {"A4090", "B2120"}),
+    ("Vehículos al final de su vida útil", {"B1250"}),
+    ("Vidrio roto", {"B2020"}),
+]
+
+MUST_RANK_FIRST = {"Baterías plomo-ácido", "Acumuladores de plomo", "Aceite lubricante usado"}
+
+FASTPATH_THRESHOLDS = (0.3, 0.35, 0.4, 0.45, 0.5, 0.6)
+FASTPATH_MARGINS = (0.0, 0.05, 0.1, 0.15, 0.2)
+
+
+def load_index() -> basel_index.BaselIndex:
+    with open(CATALOG_PATH, encoding="utf-8") as f:
+        catalog = json.load(f)
+    return basel_index.BaselIndex([basel_index.BaselEntry(e["codigo"], e["descripcion"]) for e in catalog])
+
+
+def main():
+    k = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    index = load_index()
+    top1 = in_window = 0
+    regressions = []
+    for query, expected in LABELLED:
+        ranked = index.rank(query, k=k)
+        codes = [entry.codigo for _, entry in ranked]
+        position = next((i for i, code in enumerate(codes) if code in expected), None)
+        top1 += position == 0
+        in_window += position is not None
+        if query in MUST_RANK_FIRST and position != 0:
+            regressions.append(query)
+        best = f"{ranked[0][1].codigo} {ranked[0][0]:.2f}" if ranked else "-"
+        print(f"{'ok ' if position == 0 else '   '} {query[:50]:50} want {'/'.join(sorted(expected)):17} top {best:11} rank {position + 1 if position is not None else '-'}")
+
+    n = len(LABELLED)
+    print(f"Queries: {n}, catalog entries: {len(index.entries)}")
+    print(f"{'Top-1 accuracy:':16}{top1}/{n} ({top1 / n:.0%})")
+    print(f"{f'Recall@{k}:':16}{in_window}/{n} ({in_window / n:.0%})")
+
+    print(f"\nFast path (min score {BASEL_MIN_SCORE}): hits/precision per threshold x margin")
+    print("threshold " + "".join(f"{f'margin {m}':>16}" for m in FASTPATH_MARGINS))
+    for threshold in FASTPATH_THRESHOLDS:
+        cells = []
+        for margin in FASTPATH_MARGINS:
+            hits = correct = 0
+            for query, expected in LABELLED:
+                ranked = index.confident_rank([query], threshold, margin, k=k, min_score=BASEL_MIN_SCORE)
+                if ranked:
+                    hits += 1
+                    correct += ranked[0][1].codigo in expected
+            precision = f"{correct / hits:.0%}" if hits else "-"
+            cells.append(f"{f'{hits / n:.0%} / {precision}':>16}")
+        print(f"{threshold:<10}" + "".join(cells))
+
+    if regressions:
+        print(f"Lost first place: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
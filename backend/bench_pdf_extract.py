@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import asyncio
+from io import BytesIO
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+from utils import pdf_text
+
+# Benchmark: serial pypdf extraction vs the process-pool extraction service.
+# Usage: python bench_pdf_extract.py [pages | path/to/file.pdf]
+
+
+def build_sample_pdf(pages: int) -> bytes:
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter)
+    for p in range(pages):
+        y = 760
+        c.drawString(40, y, f"DECLARACION ANUAL DE RESIDUOS SOLIDOS - UNIDAD MINERA ANDINA - Pagina {p + 1}")
+        for row in range(45):
+            y -= 16
+            c.drawString(40, y, f"{p * 45 + row + 1:>5}  Aceite lubricante usado / baterias plomo-acido / lodos   {row * 0.37:.2f} TN")
+        c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+async def bench_pool(content: bytes, pages: int) -> float:
+    start = time.perf_counter()
+    texts = await pdf_text.extract_pages(content, total_pages=pages)
+    elapsed = time.perf_counter() - start
+    assert len(texts) == pages
+    return elapsed
+
+
+def main():
+    arg = sys.argv[1] if len(sys.argv) > 1 else "400"
+    if os.path.exists(arg):
+        with open(arg, "rb") as f:
+            content = f.read()
+        print(f"Loaded {arg}")
+    else:
+        print(f"Generating a {arg}-page sample PDF...")
+        content = build_sample_pdf(int(arg))
+    pages = pdf_text.count_pages(content)
+    print(f"Pages: {pages}, size: {len(content) / 1024:.0f} KB, workers: {pdf_text.PDF_EXTRACT_WORKERS}")
+
+    start = time.perf_counter()
+    serial = pdf_text.extract_page_range(content, 0, pages)
+    serial_time = time.perf_counter() - start
+    print(f"Serial:       {serial_time:.2f}s ({pages / serial_time:.0f} pages/s)")
+
+    async def run():
+        # First call pays for spawning the workers; report warm numbers separately
+        cold = await bench_pool(content, pages)
+        warm = await bench_pool(content, pages)
+        return cold, warm
+
+    cold, warm = asyncio.run(run())
+    print(f"Pool (cold):  {cold:.2f}s ({pages / cold:.0f} pages/s)")
+    print(f"Pool (warm):  {warm:.2f}s ({pages / warm:.0f} pages/s), speedup x{serial_time / warm:.1f}")
+    pdf_text.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+import sys
+import time
+from models import AnalysisResult, PredictiveAnalysisResult
+from utils import report_generator
+
+# Benchmark: reports per second of the PDF generators, bypassing the report cache.
+# Usage: python bench_reports.py [reports per kind]
+# Measured with 50 reports per kind, median of 3 runs on one CPU. The same script
+# was copied into checkouts of the older trees, since the per-call path no longer exists:
+#                                          analysis        predictive
+#   per-call styles, logo and matplotlib   9.1 reports/s   4.5 reports/s  (159 KiB)
+#   prebuilt template (user-024)          30.0 reports/s   7.4 reports/s  (36 KiB)
+#   + vector durability chart (user-025)  33.6 reports/s  34.2 reports/s  (36 KiB)
+# Re-measure the same way after touching utils/report_generator.py.
+
+ANALYSIS = AnalysisResult(
+    materialName="Aceite dieléctrico usado",
+    category="PELIGROSO",
+    baselCode="A3020",
+    confidence=92,
+    physicochemical=[
+        {"name": "pH", "value": "7.1", "method": "EPA 9045D"},
+        {"name": "Densidad", "value": "0.88 g/cm3", "method": "ASTM D1298"},
+        {"name": "Punto de inflamación", "value": "145 °C", "method": "ASTM D93"},
+    ],
+    elemental=[
+        {"label": "Pb (Plomo)", "value": 12.5, "description": "Metal pesado"},
+        {"label": "Cu (Cobre)", "value": 0.3, "trace": True},
+    ],
+    elementalSummary="Bajo contenido metálico, trazas de cobre.",
+    engineeringContext={"structure": "Líquido viscoso", "processability": "Alta", "impurities": "Agua, sedimentos"},
+    valorizationRoutes=[
+        {"role": "Recuperación", "method": "Regeneración por destilación", "output": "Aceite base", "score": 85},
+        {"role": "Energía", "method": "Co-procesamiento", "output": "Combustible alterno", "score": 60},
+    ],
+    disposalCost=1200.0,
+    circularIncome=450.0,
+)
+
+PREDICTIVE = PredictiveAnalysisResult(
+    productOverview={"productName": "Botella PET 500 ml", "detectedPackaging": "PET", "detectedContent": "Agua"},
+    lifecycleMetrics={"estimatedLifespan": "6 meses", "durabilityScore": 35, "disposalStage": "Post-consumo"},
+    environmentalImpact={"carbonFootprintLevel": "Medio", "recycledContentPotential": "Alto", "hazardLevel": "Bajo"},
+)
+
+
+def rate(fn, data, n: int) -> tuple[float, float, int]:
+    start = time.perf_counter()
+    first = fn(data).getbuffer().nbytes
+    cold = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(n):
+        fn(data)
+    return cold, n / (time.perf_counter() - start), first
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    warmup = getattr(report_generator, "warmup", None)
+    if warmup:
+        start = time.perf_counter()
+        warmup()
+        print(f"Warmup: {(time.perf_counter() - start) * 1000:.0f} ms")
+    for name, fn, data in (
+        ("Analysis report", report_generator.generate_pdf_report, ANALYSIS),
+        ("Predictive report", report_generator.generate_predictive_report, PREDICTIVE),
+    ):
+        cold, per_second, size = rate(fn, data, n)
+        print(f"{name}: first {cold * 1000:.0f} ms, {per_second:.1f} reports/s over {n}, {size / 1024:.0f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import os
+import sys
+import time
+import tempfile
+from sqlmodel import SQLModel, Session, create_engine, select, func
+from models import Residuo
+from utils import batch_save
+
+# Benchmark: the old per-row add()+flush() loop of /save-batch vs the bulk insert path.
+# Usage: python bench_save_batch.py [rows]
+# Set BENCH_DATABASE_URL to a scratch Postgres database to measure real round trips;
+# by default a temporary SQLite file is used. The benchmark creates and empties `residuo`.
+
+
+def build_records(n: int) -> list[dict]:
+    return [
+        {
+            "responsable": "Bench",
+            "unidad_generadora": "UNIDAD MINERA ANDINA",
+            "tipo_residuo": "PELIGROSO" if i % 3 == 0 else "NO PELIGROSO",
+            "razon_social": "MINERA ANDINA S.A.",
+            "planta": f"PLANTA {i % 4}",
+            "departamento": "PUNO",
+            "codigo_basilea": "A1160" if i % 3 == 0 else None,
+            "caracteristica": f"Aceite lubricante usado lote {i}",
+            "cantidad": 1,
+            "unidad_medida": "TN",
+            "peso_total": 100 + i,
+            "costo_disposicion_final": 12.5,
+            "ingreso_economia_circular": 3.0,
+            "analysis_elemental": '[{"label": "Pb (Plomo)", "value": 1.2, "trace": false}]',
+        }
+        for i in range(n)
+    ]
+
+
+def legacy_loop(session: Session, records: list[dict]):
+    # What /save-batch used to do: one flush (one INSERT round trip) per row
+    for data in records:
+        record = Residuo.model_validate(data)
+        record.id = None
+        session.add(record)
+        session.flush()
+    session.commit()
+
+
+def bulk(session: Session, records: list[dict]):
+    result = batch_save.save_records(session, records)
+    assert not result.errors, result.errors[:3]
+    session.commit()
+
+
+def timed(engine, fn, records: list[dict]) -> float:
+    with Session(engine) as session:
+        session.exec(Residuo.__table__.delete())
+        session.commit()
+    with Session(engine) as session:
+        start = time.perf_counter()
+        fn(session, records)
+        elapsed = time.perf_counter() - start
+    with Session(engine) as session:
+        assert session.exec(select(func.count(Residuo.id))).one() == len(records)
+    return elapsed
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    url = os.getenv("BENCH_DATABASE_URL")
+    if not url:
+        url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    engine = create_engine(url)
+    SQLModel.metadata.create_all(engine)
+    records = build_records(rows)
+    print(f"Rows: {rows}, database: {engine.dialect.name}, chunk size: {batch_save.BATCH_INSERT_CHUNK_SIZE}")
+
+    legacy = timed(engine, legacy_loop, records)
+    print(f"Per-row flush: {legacy:.2f}s ({rows / legacy:.0f} rows/s)")
+    fast = timed(engine, bulk, records)
+    print(f"Bulk insert:   {fast:.2f}s ({rows / fast:.0f} rows/s)")
+    print(f"Speedup:       {legacy / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
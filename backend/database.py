@@ -1,29 +1,150 @@
 import os
-from sqlmodel import SQLModel, create_engine, Session
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlmodel import create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# Check for DATABASE_URL environment variable (from Render/Neon)
-# If not found, fall back to local SQLite
-database_url = os.getenv("DATABASE_URL")
+# Engine settings (all optional). SQL echo is off unless DB_ECHO is set.
+DB_ECHO = os.getenv("DB_ECHO", "false").lower() in ("1", "true", "yes")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))  # Postgres only, 0 disables
+
+SQLITE_FILE_NAME = os.getenv("SQLITE_FILE_NAME", "database.db")
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))  # negative = KiB, i.e. 64 MB
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+
+def _configure_sqlite(engine):
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        # Let SQLAlchemy own transaction boundaries (pysqlite's implicit BEGIN breaks SAVEPOINT)
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        # WAL lets readers proceed while a writer commits; NORMAL is durable enough with WAL
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def on_begin(connection):
+        connection.exec_driver_sql("BEGIN")
+
 
-if database_url:
-    # Postgres connection
+def _configure_postgres(engine):
+    if DB_STATEMENT_TIMEOUT_MS <= 0:
+        return
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"SET statement_timeout = {DB_STATEMENT_TIMEOUT_MS}")
+        cursor.close()
+        dbapi_connection.commit()
+
+
+def _pool_args(poolclass) -> dict:
+    return {
+        "poolclass": poolclass,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+
+
+def _normalize_url(database_url: str) -> str:
     # Fix for some cloud providers using postgres:// instead of postgresql://
     if database_url.startswith("postgres://"):
         database_url = database_url.replace("postgres://", "postgresql://", 1)
-    
-    engine = create_engine(database_url, echo=True, pool_pre_ping=True)
-    print(f"--- DATABASE CONNECTION: POSTGRESQL ({database_url.split('@')[0]}...) ---")
-else:
+    return database_url
+
+
+def create_db_engine(database_url: str | None = None):
+    """Builds the engine from DATABASE_URL (Postgres) or the local SQLite file, with pool settings from the environment."""
+    if database_url:
+        database_url = _normalize_url(database_url)
+        engine = create_engine(database_url, echo=DB_ECHO, pool_pre_ping=True, **_pool_args(QueuePool))
+        if engine.dialect.name == "postgresql":
+            _configure_postgres(engine)
+        print(f"--- DATABASE CONNECTION: POSTGRESQL ({database_url.split('@')[0]}...) ---")
+        return engine
+
     # Local SQLite connection
-    sqlite_file_name = "database.db"
-    sqlite_url = f"sqlite:///{sqlite_file_name}"
+    sqlite_url = f"sqlite:///{SQLITE_FILE_NAME}"
     connect_args = {"check_same_thread": False}
-    engine = create_engine(sqlite_url, connect_args=connect_args)
+    engine = create_engine(sqlite_url, echo=DB_ECHO, connect_args=connect_args, **_pool_args(QueuePool))
+    _configure_sqlite(engine)
     print(f"--- DATABASE CONNECTION: SQLITE (Local Fallback) ---")
+    return engine
+
+
+def to_async_url(database_url: str | None):
+    """asyncpg / aiosqlite URL for the same database as create_db_engine()."""
+    if not database_url:
+        return make_url(f"sqlite+aiosqlite:///{SQLITE_FILE_NAME}")
+    url = make_url(_normalize_url(database_url))
+    if url.get_backend_name() != "postgresql":
+        return url
+    # asyncpg takes `ssl` instead of libpq's sslmode and has no channel_binding option
+    query = dict(url.query)
+    sslmode = query.pop("sslmode", None)
+    query.pop("channel_binding", None)
+    if sslmode and sslmode != "disable":
+        query["ssl"] = sslmode
+    return url.set(drivername="postgresql+asyncpg", query=query)
+
+
+def create_async_db_engine(database_url: str | None = None):
+    """Async counterpart of create_db_engine() with the same pool settings and per-connection setup."""
+    url = to_async_url(database_url)
+    connect_args = {}
+    if url.get_backend_name() == "postgresql" and DB_STATEMENT_TIMEOUT_MS > 0:
+        connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+    engine = create_async_engine(
+        url, echo=DB_ECHO, pool_pre_ping=True, connect_args=connect_args, **_pool_args(AsyncAdaptedQueuePool)
+    )
+    if url.get_backend_name() == "sqlite":
+        _configure_sqlite(engine.sync_engine)
+    return engine
+
+
+def pool_stats(engine) -> dict:
+    pool = engine.pool
+    stats = {"dialect": engine.dialect.name, "pool": type(pool).__name__, "status": pool.status()}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+            max_overflow=DB_MAX_OVERFLOW,
+        )
+    return stats
+
+
+# Check for DATABASE_URL environment variable (from Render/Neon)
+# If not found, fall back to local SQLite
+engine = create_db_engine(os.getenv("DATABASE_URL"))
+# Used by the async endpoints so queries don't block the event loop
+async_engine = create_async_db_engine(os.getenv("DATABASE_URL"))
 
 def get_session():
     with Session(engine) as session:
         yield session
+
+async def get_async_session():
+    # expire_on_commit=False: returned objects are serialized after the commit without lazy reloads
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
@@ -0,0 +1,16 @@
+import sys
+from database import engine
+from utils import migrations
+
+# Applies pending schema migrations (also done automatically at startup).
+# Usage: python migrate.py [--status]
+
+def main():
+    if "--status" in sys.argv:
+        version = migrations.current_version(engine)
+        print(f"Schema version: {version if version is not None else 'never migrated'} (latest: {migrations.LATEST_VERSION})")
+        return
+    migrations.upgrade(engine)
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 from typing import List, Optional
 from sqlmodel import Field, SQLModel
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 
 class UserBase(SQLModel):
     email: str = Field(index=True, unique=True)
@@ -26,7 +26,13 @@ class TokenData(SQLModel):
     email: str | None = None
     
 # Manual User Table Model
-from datetime import datetime
+from datetime import date, datetime
+
+def naive_wall_time(value: datetime) -> datetime:
+    # The columns are TIMESTAMP WITHOUT TIME ZONE; Postgres used to drop the offset of
+    # ISO strings such as '2025-06-01T10:00:00.000Z', asyncpg requires us to do it
+    return value.replace(tzinfo=None) if value.tzinfo else value
+
 class Usuario(SQLModel, table=True):
     __tablename__ = "usuarios"
     id: int | None = Field(default=None, primary_key=True)
@@ -34,17 +40,19 @@ class Usuario(SQLModel, table=True):
     clave: str
     fecha_creacion: datetime = Field(default_factory=datetime.now)
 
-from sqlalchemy import Text, Column
+from sqlalchemy import Text, Column, Index, UniqueConstraint
 
 class Residuo(SQLModel, table=True):
+    # Registry listing order and keyset cursor (routers/waste.py); see utils/migrations.py
+    __table_args__ = (Index("ix_residuo_fecha_registro_id", "fecha_registro", "id"),)
     id: int | None = Field(default=None, primary_key=True)
     responsable: str
-    unidad_generadora: str
-    tipo_residuo: str
-    razon_social: Optional[str] = Field(default=None)
+    unidad_generadora: str = Field(index=True)
+    tipo_residuo: str = Field(index=True)
+    razon_social: Optional[str] = Field(default=None, index=True)
     planta: Optional[str] = Field(default=None)
     departamento: Optional[str] = Field(default=None)
-    codigo_basilea: Optional[str] = Field(default=None)
+    codigo_basilea: Optional[str] = Field(default=None, index=True)
     caracteristica: str = Field(sa_column=Column(Text))
     cantidad: float
     unidad_medida: str
@@ -71,6 +79,155 @@ class Residuo(SQLModel, table=True):
     viabilidad_reclasificacion: Optional[float] = Field(default=0.0)
     tratamiento: Optional[str] = Field(default=None, sa_column=Column(Text))
 
+    # Content hash of a batch-saved row (utils/batch_save.py); makes /save-batch retries no-ops
+    fingerprint: Optional[str] = Field(default=None, index=True, unique=True, max_length=64)
+
+    @field_validator("fecha_registro")
+    @classmethod
+    def store_naive(cls, value: datetime) -> datetime:
+        return naive_wall_time(value)
+
+# Columns of GET /waste/generation/summary; the analysis JSON and long free-text
+# fields of Residuo are left out and served by GET /waste/generation/{id}.
+class ResiduoSummary(SQLModel):
+    id: int
+    responsable: str
+    unidad_generadora: str
+    tipo_residuo: str
+    razon_social: Optional[str] = None
+    planta: Optional[str] = None
+    departamento: Optional[str] = None
+    codigo_basilea: Optional[str] = None
+    caracteristica: str
+    cantidad: float
+    unidad_medida: str
+    peso_total: float
+    fecha_registro: datetime
+    analysis_material_name: Optional[str] = None
+    costo_disposicion_final: Optional[float] = 0.0
+    ingreso_economia_circular: Optional[float] = 0.0
+    viabilidad_ec: Optional[float] = 0.0
+    viabilidad_reclasificacion: Optional[float] = 0.0
+
+# Child tables of Residuo, one row per item of its analysis_* JSON columns
+# (written at save time by utils/analysis_rows.py) so compositions can be queried in SQL.
+class ResiduoElemento(SQLModel, table=True):
+    __tablename__ = "residuo_elemento"
+    __table_args__ = (Index("ix_residuo_elemento_elemento_value", "elemento", "value"),)
+    id: int | None = Field(default=None, primary_key=True)
+    residuo_id: int = Field(foreign_key="residuo.id", index=True, ondelete="CASCADE")
+    elemento: str  # chemical symbol parsed from the label, e.g. "Pb" for "Pb (Plomo)"
+    label: str
+    value: float = 0.0
+    trace: bool = False
+
+class ResiduoPropiedad(SQLModel, table=True):
+    __tablename__ = "residuo_propiedad"
+    __table_args__ = (Index("ix_residuo_propiedad_name_numeric_value", "name", "numeric_value"),)
+    id: int | None = Field(default=None, primary_key=True)
+    residuo_id: int = Field(foreign_key="residuo.id", index=True, ondelete="CASCADE")
+    name: str
+    value: str = ""
+    method: Optional[str] = None
+    numeric_value: Optional[float] = None  # leading number of `value`, when there is one
+
+class ResiduoRuta(SQLModel, table=True):
+    __tablename__ = "residuo_ruta"
+    __table_args__ = (Index("ix_residuo_ruta_role_score", "role", "score"),)
+    id: int | None = Field(default=None, primary_key=True)
+    residuo_id: int = Field(foreign_key="residuo.id", index=True, ondelete="CASCADE")
+    role: str
+    method: Optional[str] = None
+    output: Optional[str] = None
+    score: float = 0.0
+
+class ResiduoRollup(SQLModel, table=True):
+    """
+    Monthly totals of `residuo`, maintained on every insert (utils/rollups.py).
+    Key columns store "" instead of NULL so the unique key can be upserted.
+    """
+    __tablename__ = "residuo_rollup"
+    __table_args__ = (
+        UniqueConstraint("mes", "razon_social", "planta", "departamento", "tipo_residuo", "codigo_basilea", name="uq_residuo_rollup_key"),
+    )
+    id: int | None = Field(default=None, primary_key=True)
+    mes: str = Field(index=True)  # YYYY-MM
+    razon_social: str = ""
+    planta: str = ""
+    departamento: str = ""
+    tipo_residuo: str = ""
+    codigo_basilea: str = ""
+    registros: int = 0
+    peso_total: float = 0.0
+    costo_disposicion_final: float = 0.0
+    ingreso_economia_circular: float = 0.0
+
+class ResiduoFilters(SQLModel):
+    """Query-string filters shared by the registry list and stats endpoints."""
+    fecha_desde: Optional[date] = None
+    fecha_hasta: Optional[date] = None
+    tipo_residuo: Optional[str] = None
+    codigo_basilea: Optional[str] = None
+    unidad_generadora: Optional[str] = None
+    razon_social: Optional[str] = None
+    planta: Optional[str] = None
+
+class ResiduoStatsGroup(SQLModel):
+    clave: Optional[str] = None
+    registros: int = 0
+    peso_total: float = 0.0
+    costo_disposicion_final: float = 0.0
+    ingreso_economia_circular: float = 0.0
+
+class ResiduoStats(SQLModel):
+    """Registry KPIs computed in SQL over the rows matching `ResiduoFilters`."""
+    registros: int = 0
+    peso_total: float = 0.0
+    costo_disposicion_final: float = 0.0
+    ingreso_economia_circular: float = 0.0
+    peligrosos: int = 0
+    por_tipo_residuo: list[ResiduoStatsGroup] = []
+    por_codigo_basilea: list[ResiduoStatsGroup] = []
+    group_by: Optional[str] = None
+    grupos: list[ResiduoStatsGroup] = []
+
+class ElementoMatch(SQLModel):
+    """A registry row whose elemental analysis matched GET /waste/composition."""
+    residuo_id: int
+    fecha_registro: datetime
+    razon_social: Optional[str] = None
+    tipo_residuo: str
+    caracteristica: str
+    analysis_material_name: Optional[str] = None
+    elemento: str
+    label: str
+    value: float
+    trace: bool
+
+class RutaMatch(SQLModel):
+    """A valorization route returned by GET /waste/valorization."""
+    residuo_id: int
+    fecha_registro: datetime
+    razon_social: Optional[str] = None
+    tipo_residuo: str
+    caracteristica: str
+    analysis_material_name: Optional[str] = None
+    role: str
+    method: Optional[str] = None
+    output: Optional[str] = None
+    score: float
+
+class SearchHit(SQLModel):
+    """A registry row matched by GET /waste/search; `snippet` is HTML-escaped text with the matched words in <mark>."""
+    id: int
+    fecha_registro: datetime
+    razon_social: Optional[str] = None
+    tipo_residuo: str
+    caracteristica: str
+    analysis_material_name: Optional[str] = None
+    rank: float
+    snippet: Optional[str] = None
+
 class PredictiveRegistration(SQLModel, table=True):
     id: int | None = Field(default=None, primary_key=True)
     fecha: datetime
@@ -84,6 +241,11 @@ class PredictiveRegistration(SQLModel, table=True):
     tipo_valor_ambiental: str  # reciclable, reutilizable, reaprovechable
     analysis_snapshot: Optional[str] = Field(default=None, sa_column=Column(Text))  # Store JSON as text
 
+    @field_validator("fecha")
+    @classmethod
+    def store_naive(cls, value: datetime) -> datetime:
+        return naive_wall_time(value)
+
 # Analysis Models
 class BaselCatalog(SQLModel, table=True):
     __tablename__ = "codigo_basilea"
@@ -128,6 +290,9 @@ class AnalysisResult(BaseModel):
     disposalCost: float = 0.0
     circularIncome: float = 0.0
 
+    # How the result was produced: fast-path, two-pass, cache or near-duplicate
+    analysisPath: Optional[str] = None
+
 # Predictive Analysis Models
 class ProductOverview(BaseModel):
     productName: str = "Producto Desconocido"
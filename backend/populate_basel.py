@@ -2,12 +2,12 @@ import json
 from sqlmodel import Session, select
 from models import BaselCatalog
 from database import engine
+from utils import basel_index, migrations
 import os
 
 def populate():
     # Ensure table exists
-    from sqlmodel import SQLModel
-    SQLModel.metadata.create_all(engine)
+    migrations.upgrade(engine)
     
     json_path = os.path.join(os.path.dirname(__file__), "basel_catalog.json")
     with open(json_path, "r", encoding="utf-8") as f:
@@ -31,5 +31,8 @@ def populate():
         session.commit()
         print(f"Successfully populated {len(data)} Basel codes.")
 
+    # Running API servers rebuild their in-memory catalog index on the next lookup
+    basel_index.mark_stale()
+
 if __name__ == "__main__":
     populate()
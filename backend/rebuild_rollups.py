@@ -0,0 +1,15 @@
+from sqlmodel import Session
+from database import engine
+from utils import rollups, migrations
+
+def rebuild():
+    # Ensure table exists
+    migrations.upgrade(engine)
+
+    with Session(engine) as session:
+        count = rollups.rebuild(session)
+        session.commit()
+    print(f"Rebuilt residuo_rollup: {count} rows")
+
+if __name__ == "__main__":
+    rebuild()
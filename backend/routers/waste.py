@@ -1,7 +1,19 @@
-from fastapi import APIRouter, HTTPException, Depends
+import base64
+from datetime import datetime, time, timedelta
+from typing import Literal
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+from sqlalchemy import and_, or_, func
+from sqlalchemy.orm import load_only
 from sqlmodel import Session, select
-from database import get_session
-from models import Residuo
+from sqlmodel.ext.asyncio.session import AsyncSession
+from database import get_async_session
+from models import (
+    Residuo, ResiduoSummary, ResiduoFilters, ResiduoRollup, ResiduoStats, ResiduoStatsGroup,
+    ResiduoElemento, ResiduoRuta, ElementoMatch, RutaMatch, SearchHit,
+)
+from utils import analysis_rows, rollups, search
 
 router = APIRouter(
     prefix="/waste",
@@ -9,25 +21,266 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
+DEFAULT_PAGE_SIZE = 100
+
+def validate_body(instance):
+    """
+    Table models are built from the request body without type coercion, so date
+    strings would reach the database driver as-is; this runs full validation.
+    """
+    try:
+        return type(instance).model_validate(instance, from_attributes=True)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors())
+
+def apply_residuo_filters(statement, filters: ResiduoFilters):
+    if filters.fecha_desde:
+        statement = statement.where(Residuo.fecha_registro >= datetime.combine(filters.fecha_desde, time.min))
+    if filters.fecha_hasta:
+        # Inclusive end date
+        statement = statement.where(Residuo.fecha_registro < datetime.combine(filters.fecha_hasta + timedelta(days=1), time.min))
+    for field in ("tipo_residuo", "codigo_basilea", "unidad_generadora", "razon_social", "planta"):
+        value = getattr(filters, field)
+        if value:
+            statement = statement.where(getattr(Residuo, field) == value)
+    return statement
+
+def encode_cursor(residuo: Residuo) -> str:
+    raw = f"{residuo.fecha_registro.isoformat()}|{residuo.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        fecha, residuo_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(fecha), int(residuo_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def apply_keyset(statement, cursor: str | None):
+    """Newest first, ties broken by id, resuming strictly after `cursor`."""
+    if cursor:
+        fecha, residuo_id = decode_cursor(cursor)
+        statement = statement.where(or_(
+            Residuo.fecha_registro < fecha,
+            and_(Residuo.fecha_registro == fecha, Residuo.id < residuo_id),
+        ))
+    return statement.order_by(Residuo.fecha_registro.desc(), Residuo.id.desc())
+
+def residuo_aggregates():
+    return (
+        func.count(Residuo.id),
+        func.coalesce(func.sum(Residuo.peso_total), 0.0),
+        func.coalesce(func.sum(Residuo.costo_disposicion_final), 0.0),
+        func.coalesce(func.sum(Residuo.ingreso_economia_circular), 0.0),
+    )
+
+def rollup_aggregates():
+    return (
+        func.coalesce(func.sum(ResiduoRollup.registros), 0),
+        func.coalesce(func.sum(ResiduoRollup.peso_total), 0.0),
+        func.coalesce(func.sum(ResiduoRollup.costo_disposicion_final), 0.0),
+        func.coalesce(func.sum(ResiduoRollup.ingreso_economia_circular), 0.0),
+    )
+
+def compute_stats(session: Session, filters: ResiduoFilters, group_by: str | None = None) -> ResiduoStats:
+    """Reads the monthly rollups when the filters allow it, otherwise aggregates `residuo` directly."""
+    if rollups.can_serve(filters):
+        aggregates, where, model = rollup_aggregates(), rollups.apply_filters, ResiduoRollup
+        month = ResiduoRollup.mes
+    else:
+        aggregates, where, model = residuo_aggregates(), apply_residuo_filters, Residuo
+        month = rollups.month_expression(Residuo.fecha_registro, session.get_bind().dialect.name)
+
+    def grouped(key) -> list[ResiduoStatsGroup]:
+        rows = session.exec(where(select(key, *aggregates), filters).group_by(key).order_by(key)).all()
+        return [
+            # Rollups store missing keys as ""
+            ResiduoStatsGroup(clave=clave or None, registros=registros, peso_total=peso, costo_disposicion_final=costo, ingreso_economia_circular=ingreso)
+            for clave, registros, peso, costo, ingreso in rows
+        ]
+
+    registros, peso, costo, ingreso = session.exec(where(select(*aggregates), filters)).one()
+    por_tipo = grouped(model.tipo_residuo)
+    stats = ResiduoStats(
+        registros=registros,
+        peso_total=peso,
+        costo_disposicion_final=costo,
+        ingreso_economia_circular=ingreso,
+        peligrosos=sum(g.registros for g in por_tipo if g.clave == "PELIGROSO"),
+        por_tipo_residuo=por_tipo,
+        por_codigo_basilea=grouped(model.codigo_basilea),
+        group_by=group_by,
+    )
+    if group_by:
+        stats.grupos = grouped(month if group_by == "month" else getattr(model, group_by))
+    return stats
+
 @router.post("/generation", response_model=Residuo)
-async def create_waste_generation(residuo: Residuo, session: Session = Depends(get_session)):
+async def create_waste_generation(residuo: Residuo, session: AsyncSession = Depends(get_async_session)):
+    residuo = validate_body(residuo)
     try:
         print(f"Received registration: {residuo.responsable} - Analysis included: {residuo.analysis_material_name is not None}")
         session.add(residuo)
-        session.commit()
-        session.refresh(residuo)
+        await session.flush()  # assigns the id the analysis child rows refer to
+        await session.run_sync(rollups.record, [residuo])
+        await session.run_sync(analysis_rows.record, [residuo])
+        await session.commit()
+        await session.refresh(residuo)
         return residuo
     except Exception as e:
-        session.rollback()
+        await session.rollback()
         print(f"Error in create_waste_generation: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to register waste generation: {str(e)}")
 
+async def read_page(session: AsyncSession, statement, response: Response, limit: int | None, cursor: str | None):
+    statement = apply_keyset(statement, cursor)
+    page_size = limit or (DEFAULT_PAGE_SIZE if cursor else None)
+    if page_size:
+        # One extra row tells us whether there is a next page
+        statement = statement.limit(page_size + 1)
+    results = (await session.exec(statement)).all()
+    if page_size and len(results) > page_size:
+        results = results[:page_size]
+        response.headers["X-Next-Cursor"] = encode_cursor(results[-1])
+    return results
+
 @router.get("/generation", response_model=list[Residuo])
-async def read_waste_generation(session: Session = Depends(get_session)):
+async def read_waste_generation(
+    response: Response,
+    filters: ResiduoFilters = Depends(),
+    limit: int | None = Query(None, ge=1, le=1000),
+    cursor: str | None = None,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """
+    Registry rows, newest first, filtered server-side.
+    Pass `limit` (and then the `X-Next-Cursor` response header as `cursor`) to page
+    through the registry; without them every matching row is returned.
+    """
     try:
-        # Sort by fecha_registro descending
-        statement = select(Residuo).order_by(Residuo.fecha_registro.desc())
-        results = session.exec(statement).all()
-        return results
+        return await read_page(session, apply_residuo_filters(select(Residuo), filters), response, limit, cursor)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch waste generation records: {str(e)}")
+
+SUMMARY_COLUMNS = [getattr(Residuo, name) for name in ResiduoSummary.model_fields]
+
+@router.get("/generation/summary", response_model=list[ResiduoSummary])
+async def read_waste_generation_summary(
+    response: Response,
+    filters: ResiduoFilters = Depends(),
+    limit: int | None = Query(None, ge=1, le=1000),
+    cursor: str | None = None,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """
+    Same rows, filters and paging as GET /generation, but only the columns the
+    registry table shows; the analysis JSON is never read from the database.
+    """
+    try:
+        statement = apply_residuo_filters(select(Residuo).options(load_only(*SUMMARY_COLUMNS, raiseload=True)), filters)
+        return await read_page(session, statement, response, limit, cursor)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch waste generation summary: {str(e)}")
+
+@router.get("/search", response_model=list[SearchHit])
+async def search_waste(
+    q: str = Query(..., min_length=2, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Full-text search over type, description, analysed material and circular-economy opportunities."""
+    try:
+        return await session.run_sync(search.search, q, limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to search waste records: {str(e)}")
+
+@router.get("/generation/{residuo_id}", response_model=Residuo)
+async def read_waste_generation_detail(residuo_id: int, session: AsyncSession = Depends(get_async_session)):
+    """One registry row with its full analysis."""
+    residuo = await session.get(Residuo, residuo_id)
+    if residuo is None:
+        raise HTTPException(status_code=404, detail="Registro no encontrado")
+    return residuo
+
+@router.get("/stats", response_model=ResiduoStats)
+async def read_waste_stats(
+    filters: ResiduoFilters = Depends(),
+    group_by: Literal["planta", "departamento", "month"] | None = None,
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Totals and breakdowns for the reports dashboard, aggregated in SQL with the list endpoint's filters."""
+    try:
+        return await session.run_sync(compute_stats, filters, group_by)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to compute waste statistics: {str(e)}")
+
+MATCH_COLUMNS = (
+    Residuo.fecha_registro, Residuo.razon_social, Residuo.tipo_residuo,
+    Residuo.caracteristica, Residuo.analysis_material_name,
+)
+
+@router.get("/composition", response_model=list[ElementoMatch])
+async def read_waste_composition(
+    elemento: str,
+    min_value: float | None = None,
+    max_value: float | None = None,
+    include_trace: bool = True,
+    limit: int = Query(100, ge=1, le=1000),
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Registry rows containing `elemento` (symbol, e.g. "Pb"), highest concentration first."""
+    try:
+        statement = (
+            select(ResiduoElemento, *MATCH_COLUMNS)
+            .join(Residuo, Residuo.id == ResiduoElemento.residuo_id)
+            .where(ResiduoElemento.elemento == analysis_rows.element_symbol(elemento))
+        )
+        if min_value is not None:
+            statement = statement.where(ResiduoElemento.value >= min_value)
+        if max_value is not None:
+            statement = statement.where(ResiduoElemento.value <= max_value)
+        if not include_trace:
+            statement = statement.where(ResiduoElemento.trace == False)  # noqa: E712
+        statement = statement.order_by(ResiduoElemento.value.desc(), ResiduoElemento.id).limit(limit)
+        rows = (await session.exec(statement)).all()
+        return [
+            ElementoMatch(
+                residuo_id=e.residuo_id, fecha_registro=fecha, razon_social=razon, tipo_residuo=tipo,
+                caracteristica=caracteristica, analysis_material_name=material,
+                elemento=e.elemento, label=e.label, value=e.value, trace=e.trace,
+            )
+            for e, fecha, razon, tipo, caracteristica, material in rows
+        ]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to query waste composition: {str(e)}")
+
+@router.get("/valorization", response_model=list[RutaMatch])
+async def read_waste_valorization(
+    role: str | None = None,
+    min_score: float | None = None,
+    limit: int = Query(100, ge=1, le=1000),
+    session: AsyncSession = Depends(get_async_session),
+):
+    """Valorization routes of the registry, best score first, optionally for a single `role`."""
+    try:
+        statement = select(ResiduoRuta, *MATCH_COLUMNS).join(Residuo, Residuo.id == ResiduoRuta.residuo_id)
+        if role:
+            statement = statement.where(ResiduoRuta.role == role)
+        if min_score is not None:
+            statement = statement.where(ResiduoRuta.score >= min_score)
+        statement = statement.order_by(ResiduoRuta.score.desc(), ResiduoRuta.id).limit(limit)
+        rows = (await session.exec(statement)).all()
+        return [
+            RutaMatch(
+                residuo_id=r.residuo_id, fecha_registro=fecha, razon_social=razon, tipo_residuo=tipo,
+                caracteristica=caracteristica, analysis_material_name=material,
+                role=r.role, method=r.method, output=r.output, score=r.score,
+            )
+            for r, fecha, razon, tipo, caracteristica, material in rows
+        ]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to query valorization routes: {str(e)}")
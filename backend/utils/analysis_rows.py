@@ -0,0 +1,118 @@
+import re
+import json
+from sqlalchemy import delete, insert
+from sqlmodel import Session, select
+from models import Residuo, ResiduoElemento, ResiduoPropiedad, ResiduoRuta
+
+# Typed child rows of the analysis_* JSON columns of Residuo.
+# The JSON stays the source of truth for the UI (the registry page parses it);
+# these tables make "which waste has more than 5% Pb" or "best valorization
+# routes for role X" indexed SQL queries instead of a scan over every JSON blob.
+# record() runs in the caller's transaction, right after the Residuo inserts.
+INSERT_CHUNK_SIZE = 500
+
+SYMBOL_PATTERN = re.compile(r"^[A-Z][a-z]?$")
+NUMBER_PATTERN = re.compile(r"[-+]?\d+(?:[.,]\d+)?")
+
+
+def element_symbol(label: str) -> str:
+    """Chemical symbol of an element label: "Pb (Plomo)", "Plomo (Pb)" and "Pb" all give "Pb"."""
+    label = (label or "").strip()
+    candidates = [label.split("(")[0].strip(), *re.findall(r"\(([^)]*)\)", label)]
+    for candidate in candidates:
+        candidate = candidate.strip()
+        if SYMBOL_PATTERN.match(candidate):
+            return candidate
+    return label
+
+
+def to_float(value) -> float | None:
+    """Leading number of `value` ("12,5 %" -> 12.5), or None."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = NUMBER_PATTERN.search(str(value or ""))
+    return float(match.group().replace(",", ".")) if match else None
+
+
+def _load_list(data) -> list[dict]:
+    if isinstance(data, str):
+        try:
+            data = json.loads(data)
+        except ValueError:
+            return []
+    if not isinstance(data, list):
+        return []
+    return [item for item in data if isinstance(item, dict)]
+
+
+def child_rows(residuo: Residuo) -> tuple[list[dict], list[dict], list[dict]]:
+    """Element, property and route rows for one saved residuo (its id must be set)."""
+    elementos = [
+        {
+            "residuo_id": residuo.id,
+            "elemento": element_symbol(str(item.get("label", ""))),
+            "label": str(item.get("label", "")),
+            "value": to_float(item.get("value")) or 0.0,
+            "trace": bool(item.get("trace")),
+        }
+        for item in _load_list(residuo.analysis_elemental)
+        if item.get("label")
+    ]
+    propiedades = [
+        {
+            "residuo_id": residuo.id,
+            "name": str(item.get("name")),
+            "value": str(item.get("value", "")),
+            "method": item.get("method"),
+            "numeric_value": to_float(item.get("value")),
+        }
+        for item in _load_list(residuo.analysis_physicochemical)
+        if item.get("name")
+    ]
+    rutas = [
+        {
+            "residuo_id": residuo.id,
+            "role": str(item.get("role")),
+            "method": item.get("method"),
+            "output": item.get("output"),
+            "score": to_float(item.get("score")) or 0.0,
+        }
+        for item in _load_list(residuo.analysis_valorization)
+        if item.get("role")
+    ]
+    return elementos, propiedades, rutas
+
+
+def record(session: Session, residuos: list[Residuo]) -> int:
+    """Writes the child rows of freshly inserted `residuos`. Does not commit. Returns the rows written."""
+    tables = ((ResiduoElemento, []), (ResiduoPropiedad, []), (ResiduoRuta, []))
+    for residuo in residuos:
+        if residuo.id is None:
+            continue
+        for (_, rows), new_rows in zip(tables, child_rows(residuo)):
+            rows.extend(new_rows)
+    written = 0
+    for model, rows in tables:
+        for i in range(0, len(rows), INSERT_CHUNK_SIZE):
+            session.execute(insert(model), rows[i : i + INSERT_CHUNK_SIZE])
+        written += len(rows)
+    return written
+
+
+def rebuild(session: Session, batch_size: int = 1000) -> int:
+    """Recomputes every child row from the JSON columns. Does not commit. Returns the rows written."""
+    for model in (ResiduoElemento, ResiduoPropiedad, ResiduoRuta):
+        session.execute(delete(model))
+    written = 0
+    last_id = 0
+    while True:
+        batch = session.exec(
+            select(Residuo).where(Residuo.id > last_id).order_by(Residuo.id).limit(batch_size)
+        ).all()
+        if not batch:
+            return written
+        written += record(session, batch)
+        last_id = batch[-1].id
+        session.expunge_all()
@@ -0,0 +1,303 @@
+import os
+import re
+import time
+import threading
+import unicodedata
+from typing import NamedTuple
+import numpy as np
+from sqlmodel import Session, select
+from models import BaselCatalog
+
+# In-memory ranking index over the `codigo_basilea` table.
+# Loaded once at startup; populate_basel.py touches a stamp file after it
+# changes the table and the next lookup reloads the index in a background
+# thread while the current one keeps serving.
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASEL_INDEX_STAMP = os.getenv("BASEL_INDEX_STAMP", os.path.join(BACKEND_DIR, ".cache", "basel_catalog.stamp"))
+STAMP_CHECK_INTERVAL_SECONDS = 5.0
+
+# Ranking: BM25 over stemmed terms blended with char n-gram TF-IDF cosine,
+# which catches partial matches such as 'plomo-ácido' or truncated words.
+BM25_K1 = 1.2
+BM25_B = 0.75
+NGRAM_SIZE = 3
+BM25_WEIGHT = float(os.getenv("BASEL_BM25_WEIGHT", "0.6"))
+# Score multiplier for entries that exclude one of the query's terms
+# ('Baterías ... con exclusión de los fabricados con plomo' vs 'baterías plomo-ácido')
+EXCLUSION_PENALTY = float(os.getenv("BASEL_EXCLUSION_PENALTY", "0.2"))
+
+SPANISH_STOPWORDS = {
+    "a", "al", "algo", "ante", "antes", "aqui", "asi", "bajo", "cada", "como", "con", "contra",
+    "cual", "cuando", "de", "del", "desde", "donde", "durante", "e", "el", "ella", "ellas", "ellos",
+    "en", "entre", "era", "es", "esa", "esas", "ese", "eso", "esos", "esta", "estas", "este", "esto",
+    "estos", "fue", "ha", "han", "hasta", "hay", "la", "las", "le", "les", "lo", "los", "mas", "mediante",
+    "mismo", "muy", "no", "ni", "o", "otra", "otras", "otro", "otros", "para", "pero", "por", "que",
+    "se", "segun", "ser", "si", "sin", "sobre", "son", "su", "sus", "tal", "tambien", "tanto", "todo",
+    "todos", "tras", "u", "un", "una", "unas", "uno", "unos", "y", "ya",
+    # Catalog boilerplate that appears in almost every entry
+    "residuo", "residuos", "desecho", "desechos",
+}
+
+# Everyday words for things the catalog names differently, keyed by stem;
+# the catalog's wording is appended to the query before ranking
+QUERY_SYNONYMS = {
+    "bateri": "acumuladores",
+    "pila": "baterias",
+    "lubricant": "aceites minerales",
+    "hidraulic": "aceites minerales",
+    "raee": "montajes electricos electronicos",
+    "llant": "cubiertas neumaticas",
+}
+
+
+def fold_accents(text: str) -> str:
+    normalized = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in normalized if not unicodedata.combining(c)).lower()
+
+
+def stem(word: str) -> str:
+    """
+    Light Spanish stemmer: strips plurals and the final gender vowel so
+    'baterías', 'batería' and 'baterias' all map to 'bateri'.
+    """
+    if len(word) <= 3 or word.isdigit():
+        return word
+    if word.endswith("ces") and len(word) > 4:
+        word = word[:-3] + "z"
+    elif word.endswith("es") and len(word) > 4 and word[-3] not in "aeiou":
+        word = word[:-2]
+    elif word.endswith("s"):
+        word = word[:-1]
+    if len(word) > 4 and word[-1] in "aeo":
+        word = word[:-1]
+    return word
+
+
+def _words(text: str) -> list[str]:
+    words = re.findall(r"[a-z0-9]+", fold_accents(text or ""))
+    return [w for w in words if len(w) > 2 and w not in SPANISH_STOPWORDS]
+
+
+def tokenize(text: str) -> list[str]:
+    """Accent-folded, stopword-free, stemmed terms of `text`."""
+    return [stem(w) for w in _words(text)]
+
+
+# Clauses that carve terms out of an entry ('con exclusión de los fabricados con plomo'),
+# up to the end of the sentence, list item or parenthesis
+EXCLUSION_PATTERN = re.compile(
+    r"(?:con exclusion de|excepto|salvo|no contaminad[oa]s? con|que no contengan?)([^.;:()]*)"
+)
+
+
+def expand_query(query: str) -> str:
+    extra = {QUERY_SYNONYMS[term] for term in tokenize(query) if term in QUERY_SYNONYMS}
+    return " ".join([query, *sorted(extra)])
+
+
+def excluded_terms(description: str) -> set[str]:
+    """Terms that an entry mentions only to exclude them."""
+    folded = fold_accents(description or "")
+    clauses = EXCLUSION_PATTERN.findall(folded)
+    if not clauses:
+        return set()
+    excluded = {term for clause in clauses for term in tokenize(clause)}
+    # B1020 excludes 'acumuladores de plomo' but still covers 'residuos de plomo'
+    return excluded - set(tokenize(EXCLUSION_PATTERN.sub(" ", folded)))
+
+
+def char_ngrams(text: str, n: int = NGRAM_SIZE) -> list[str]:
+    grams = []
+    for word in _words(text):
+        padded = f" {word} "
+        grams.extend(padded[i : i + n] for i in range(len(padded) - n + 1))
+    return grams
+
+
+def _count_matrix(docs: list[list[str]]) -> tuple[dict[str, int], np.ndarray]:
+    vocab: dict[str, int] = {}
+    for tokens in docs:
+        for tok in tokens:
+            vocab.setdefault(tok, len(vocab))
+    counts = np.zeros((len(docs), max(len(vocab), 1)), dtype=np.float32)
+    for row, tokens in enumerate(docs):
+        for tok in tokens:
+            counts[row, vocab[tok]] += 1
+    return vocab, counts
+
+
+class BaselEntry(NamedTuple):
+    codigo: str
+    descripcion: str
+
+
+class BaselIndex:
+    def __init__(self, entries: list[BaselEntry]):
+        self.entries = entries
+        self._build_matrices()
+
+    def _build_matrices(self):
+        n_docs = len(self.entries)
+
+        # BM25 weights, one row per catalog entry
+        term_docs = [tokenize(e.descripcion) + [e.codigo.lower()] for e in self.entries]
+        self.term_vocab, tf = _count_matrix(term_docs)
+        df = (tf > 0).sum(axis=0)
+        self.term_idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        self.unseen_term_idf = float(np.log1p((n_docs + 0.5) / 0.5))
+        doc_len = tf.sum(axis=1, keepdims=True)
+        avg_len = float(doc_len.mean()) if n_docs else 1.0
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_len / max(avg_len, 1.0))
+        self.bm25 = self.term_idf * tf * (BM25_K1 + 1) / (tf + norm)
+        self.excluded = np.zeros(tf.shape, dtype=bool)
+        for row, entry in enumerate(self.entries):
+            for term in excluded_terms(entry.descripcion) & self.term_vocab.keys():
+                self.excluded[row, self.term_vocab[term]] = True
+
+        # L2-normalised char n-gram TF-IDF
+        gram_docs = [char_ngrams(f"{e.codigo} {e.descripcion}") for e in self.entries]
+        self.gram_vocab, gram_tf = _count_matrix(gram_docs)
+        gram_df = (gram_tf > 0).sum(axis=0)
+        self.gram_idf = (np.log((n_docs + 1) / (gram_df + 1)) + 1).astype(np.float32)
+        self.unseen_gram_idf = float(np.log(n_docs + 1) + 1)
+        grams = gram_tf * self.gram_idf
+        lengths = np.linalg.norm(grams, axis=1, keepdims=True)
+        self.grams = grams / np.where(lengths > 0, lengths, 1)
+
+    def _bm25_scores(self, query: str) -> np.ndarray:
+        """
+        BM25 relative to an average-length entry that contains every query term once,
+        so roughly the idf-weighted share of the query that matched (capped at 1).
+        """
+        terms = set(tokenize(query))
+        cols = [self.term_vocab[t] for t in terms if t in self.term_vocab]
+        bound = float(self.term_idf[cols].sum()) + self.unseen_term_idf * (len(terms) - len(cols))
+        if not cols or bound <= 0:
+            return np.zeros(len(self.entries), dtype=np.float32)
+        return np.minimum(self.bm25[:, cols].sum(axis=1) / bound, 1.0)
+
+    def _ngram_scores(self, query: str) -> np.ndarray:
+        q = np.zeros(self.grams.shape[1], dtype=np.float32)
+        unseen_sq = 0.0
+        for gram in char_ngrams(query):
+            col = self.gram_vocab.get(gram)
+            if col is None:
+                unseen_sq += self.unseen_gram_idf ** 2
+            else:
+                q[col] += self.gram_idf[col]
+        q_norm = float(np.sqrt(np.dot(q, q) + unseen_sq))
+        if q_norm == 0:
+            return np.zeros(len(self.entries), dtype=np.float32)
+        return self.grams @ (q / q_norm)
+
+    def rank(self, query: str, k: int = 5, min_score: float = 0.0) -> list[tuple[float, BaselEntry]]:
+        """Top-k (score, entry) pairs, score in [0, 1], best first."""
+        if not self.entries:
+            return []
+        query = expand_query(query)
+        scores = BM25_WEIGHT * self._bm25_scores(query) + (1 - BM25_WEIGHT) * self._ngram_scores(query)
+        cols = [self.term_vocab[t] for t in set(tokenize(query)) if t in self.term_vocab]
+        if cols:
+            scores = np.where(self.excluded[:, cols].any(axis=1), scores * EXCLUSION_PENALTY, scores)
+        k = min(k, len(self.entries))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(round(float(scores[i]), 4), self.entries[i]) for i in top if scores[i] > min_score]
+
+    def confident_rank(
+        self, queries: list[str], threshold: float, margin: float, k: int = 5, min_score: float = 0.0
+    ) -> list[tuple[float, BaselEntry]] | None:
+        """
+        Ranked candidates of the strongest query, or None unless its top candidate
+        scores at least `threshold`, leads the runner-up by `margin` and doesn't
+        exclude any of the query's terms.
+        """
+        best = None
+        for query in queries:
+            ranked = self.rank(query, k, min_score)
+            if ranked and (best is None or ranked[0][0] > best[1][0][0]):
+                best = (query, ranked)
+        if best is None:
+            return None
+
+        query, ranked = best
+        top_score, top_item = ranked[0]
+        runner_up = ranked[1][0] if len(ranked) > 1 else 0.0
+        if top_score < threshold or top_score - runner_up < margin:
+            return None
+        # rank() already demotes such entries; one on top means nothing better matched
+        if set(tokenize(query)) & excluded_terms(top_item.descripcion):
+            return None
+        return ranked
+
+
+_index = BaselIndex([])
+_loaded_at = 0.0
+_last_stamp_check = 0.0
+_engine = None
+_lock = threading.Lock()
+_reloading = False
+
+
+def _stamp_mtime() -> float:
+    try:
+        return os.stat(BASEL_INDEX_STAMP).st_mtime
+    except OSError:
+        return 0.0
+
+
+def load(engine) -> int:
+    """(Re)builds the index from the database. Returns the number of catalog entries."""
+    global _index, _loaded_at, _engine
+    with Session(engine) as session:
+        rows = session.exec(select(BaselCatalog.codigo, BaselCatalog.descripcion)).all()
+    index = BaselIndex([BaselEntry(codigo, descripcion or "") for codigo, descripcion in rows])
+    with _lock:
+        _index = index
+        _engine = engine
+        _loaded_at = time.time()
+    print(f"Basel Index: loaded {len(index.entries)} catalog entries, {len(index.term_vocab)} terms")
+    return len(index.entries)
+
+
+def mark_stale():
+    """Signals running servers that the catalog table changed (called by populate_basel.py)."""
+    os.makedirs(os.path.dirname(BASEL_INDEX_STAMP), exist_ok=True)
+    with open(BASEL_INDEX_STAMP, "a"):
+        pass
+    os.utime(BASEL_INDEX_STAMP, None)
+
+
+def _reload(engine):
+    global _reloading
+    try:
+        load(engine)
+    except Exception as e:
+        print(f"Basel Index: reload failed, keeping previous index: {e}")
+    finally:
+        _reloading = False
+
+
+def get_index() -> BaselIndex:
+    """
+    Current index. A stale one is replaced by a background reload, so callers
+    on the event loop never wait for the database.
+    """
+    global _last_stamp_check, _reloading
+    now = time.time()
+    if _engine is not None and not _reloading and now - _last_stamp_check > STAMP_CHECK_INTERVAL_SECONDS:
+        _last_stamp_check = now
+        if _stamp_mtime() > _loaded_at:
+            _reloading = True
+            threading.Thread(target=_reload, args=(_engine,), daemon=True).start()
+    return _index
+
+
+def rank(query: str, k: int = 5, min_score: float = 0.0) -> list[tuple[float, BaselEntry]]:
+    return get_index().rank(query, k, min_score)
+
+
+def confident_rank(
+    queries: list[str], threshold: float, margin: float, k: int = 5, min_score: float = 0.0
+) -> list[tuple[float, BaselEntry]] | None:
+    return get_index().confident_rank(queries, threshold, margin, k, min_score)
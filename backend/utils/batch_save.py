@@ -0,0 +1,168 @@
+import os
+import json
+import hashlib
+from typing import NamedTuple
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+from dotenv import load_dotenv
+from models import Residuo
+from utils import analysis_rows, rollups
+
+load_dotenv()
+
+# Bulk insert path for /save-batch.
+# Rows are validated up front, then written with multi-row INSERTs, one per chunk.
+# A chunk that fails is retried row by row inside savepoints, so one bad row only
+# costs its own chunk a slower path instead of aborting the batch.
+# Rows extracted from a document carry a fingerprint and are inserted with
+# ON CONFLICT DO NOTHING, so retrying a save never duplicates them. The save
+# time is left out of the fingerprint: source_hash already pins the document.
+# The inserts return the new ids, which the analysis child rows need.
+BATCH_INSERT_CHUNK_SIZE = int(os.getenv("BATCH_INSERT_CHUNK_SIZE", "200"))
+
+
+class BatchSaveResult(NamedTuple):
+    saved: list[Residuo]
+    errors: list[dict]    # {"index": 1-based position in the request, "error": message}
+    duplicates: int = 0   # rows skipped because their fingerprint was already stored
+
+
+def _describe_validation_error(error: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(p) for p in e['loc'])}: {e['msg']}" for e in error.errors())
+
+
+def describe_db_error(error: Exception) -> str:
+    return str(getattr(error, "orig", None) or error).strip()
+
+
+def fingerprint(source_hash: str, item_num, residuo: Residuo) -> str:
+    """Identity of an extracted row: source document, row number, company, type and weight."""
+    payload = json.dumps(
+        [
+            source_hash,
+            str(item_num) if item_num is not None else None,
+            (residuo.razon_social or "").strip().upper(),
+            (residuo.tipo_residuo or "").strip().upper(),
+            round(residuo.peso_total, 6),
+        ],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def validate_records(records: list[dict]) -> tuple[list[tuple[int, Residuo]], list[dict], int]:
+    """
+    Normalizes and validates every row before touching the database.
+    Rows repeated within the request are dropped here and counted as duplicates.
+    """
+    valid, errors = [], []
+    seen = set()
+    duplicates = 0
+    for index, raw in enumerate(records, start=1):
+        if not isinstance(raw, dict):
+            errors.append({"index": index, "error": "record must be an object"})
+            continue
+        # Force ID to None to ensure insertion; the fingerprint is always computed here
+        data = {k: v for k, v in raw.items() if k not in ("id", "fingerprint")}
+        if not data.get("responsable"):
+            data["responsable"] = "Sistema IA"
+        if not data.get("unidad_generadora"):
+            data["unidad_generadora"] = "NO ESPECIFICADO"
+        try:
+            residuo = Residuo.model_validate(data)
+        except ValidationError as e:
+            errors.append({"index": index, "error": _describe_validation_error(e)})
+            continue
+        # Only rows that come from a known document (see /extract-rows) have a stable identity
+        if raw.get("source_hash"):
+            residuo.fingerprint = fingerprint(raw["source_hash"], raw.get("item_num"), residuo)
+            if residuo.fingerprint in seen:
+                duplicates += 1
+                continue
+            seen.add(residuo.fingerprint)
+        valid.append((index, residuo))
+    return valid, errors, duplicates
+
+
+def _insert(session: Session, residuos: list[Residuo]) -> list[Residuo]:
+    """
+    Inserts `residuos`, skipping fingerprints that already exist.
+    Returns the rows actually written, with their ids set.
+    """
+    dialect_name = session.get_bind().dialect.name
+    if dialect_name not in ("postgresql", "sqlite"):
+        return _insert_portable(session, residuos)
+
+    written = []
+    plain = [r for r in residuos if not r.fingerprint]
+    if plain:
+        statement = insert(Residuo).returning(Residuo.id, sort_by_parameter_order=True)
+        ids = session.execute(statement, [r.model_dump(exclude={"id"}) for r in plain]).scalars().all()
+        for residuo, residuo_id in zip(plain, ids):
+            residuo.id = residuo_id
+        written.extend(plain)
+
+    fingerprinted = [r for r in residuos if r.fingerprint]
+    if fingerprinted:
+        dialect_insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+        statement = dialect_insert(Residuo).on_conflict_do_nothing(index_elements=["fingerprint"])
+        statement = statement.returning(Residuo.id, Residuo.fingerprint)
+        ids = dict((fp, residuo_id) for residuo_id, fp in session.execute(
+            statement, [r.model_dump(exclude={"id"}) for r in fingerprinted]
+        ))
+        for residuo in fingerprinted:
+            if residuo.fingerprint in ids:
+                residuo.id = ids[residuo.fingerprint]
+                written.append(residuo)
+    return written
+
+
+def _insert_portable(session: Session, residuos: list[Residuo]) -> list[Residuo]:
+    # Other databases: filter out stored fingerprints first, let the ORM fetch the ids
+    fingerprints = [r.fingerprint for r in residuos if r.fingerprint]
+    stored = set(session.exec(select(Residuo.fingerprint).where(Residuo.fingerprint.in_(fingerprints))).all()) if fingerprints else set()
+    residuos = [r for r in residuos if r.fingerprint not in stored]
+    session.add_all(residuos)
+    session.flush()
+    return residuos
+
+
+def save_records(session: Session, records: list[dict], atomic: bool = False) -> BatchSaveResult:
+    """
+    Inserts the valid rows, their analysis child rows and the rollups. Does not commit.
+    With `atomic`, nothing is written when any row is invalid and database errors propagate.
+    """
+    valid, errors, duplicates = validate_records(records)
+    if atomic and errors:
+        return BatchSaveResult([], errors, duplicates)
+
+    saved = []
+    failed = 0
+    for i in range(0, len(valid), BATCH_INSERT_CHUNK_SIZE):
+        chunk = valid[i : i + BATCH_INSERT_CHUNK_SIZE]
+        residuos = [residuo for _, residuo in chunk]
+        if atomic:
+            saved.extend(_insert(session, residuos))
+            continue
+        try:
+            with session.begin_nested():
+                written = _insert(session, residuos)
+            saved.extend(written)
+        except Exception as chunk_error:
+            print(f"Batch Save: chunk at row {chunk[0][0]} failed ({describe_db_error(chunk_error)}), isolating rows")
+            for index, residuo in chunk:
+                try:
+                    with session.begin_nested():
+                        written = _insert(session, [residuo])
+                    saved.extend(written)
+                except Exception as e:
+                    failed += 1
+                    errors.append({"index": index, "error": describe_db_error(e)})
+
+    duplicates += len(valid) - len(saved) - failed
+    rollups.record(session, saved)
+    analysis_rows.record(session, saved)
+    errors.sort(key=lambda e: e["index"])
+    return BatchSaveResult(saved, errors, duplicates)
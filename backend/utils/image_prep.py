@@ -0,0 +1,77 @@
+import os
+import io
+import math
+import time
+from typing import NamedTuple
+from PIL import Image, ImageOps
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Photos are shrunk before they reach Gemini. Left as PIL images, the SDK would
+# upload them as full-resolution lossless WebP, so we hand it a compact JPEG blob.
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1600"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+
+
+class PreparedImage(NamedTuple):
+    blob: dict            # {"mime_type": ..., "data": ...}, accepted directly by generate_content
+    image: Image.Image    # downscaled, orientation-corrected RGB image
+    stats: dict
+
+
+def prepare_image(content: bytes) -> PreparedImage:
+    """Decode (draft mode for JPEG), apply EXIF orientation, downscale and re-encode as JPEG."""
+    timings = {}
+    start = time.perf_counter()
+
+    image = Image.open(io.BytesIO(content))
+    original_size = image.size
+    if image.format == "JPEG" and max(original_size) > IMAGE_MAX_EDGE:
+        # libjpeg decodes straight to 1/2, 1/4 or 1/8 scale, never below the requested size
+        scale = IMAGE_MAX_EDGE / max(original_size)
+        image.draft("RGB", (math.ceil(original_size[0] * scale), math.ceil(original_size[1] * scale)))
+    image.load()
+    decoded_size = image.size
+    mark = time.perf_counter()
+    timings["decode_ms"] = round((mark - start) * 1000, 1)
+
+    image = ImageOps.exif_transpose(image)
+    now = time.perf_counter()
+    timings["orient_ms"] = round((now - mark) * 1000, 1)
+    mark = now
+
+    if max(image.size) > IMAGE_MAX_EDGE:
+        image.thumbnail((IMAGE_MAX_EDGE, IMAGE_MAX_EDGE), Image.LANCZOS)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    now = time.perf_counter()
+    timings["resize_ms"] = round((now - mark) * 1000, 1)
+    mark = now
+
+    out = io.BytesIO()
+    image.save(out, format="JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True)
+    data = out.getvalue()
+    now = time.perf_counter()
+    timings["encode_ms"] = round((now - mark) * 1000, 1)
+    timings["total_ms"] = round((now - start) * 1000, 1)
+
+    stats = {
+        "original_bytes": len(content),
+        "prepared_bytes": len(data),
+        "saved_bytes": len(content) - len(data),
+        "original_size": original_size,
+        "decoded_size": decoded_size,
+        "prepared_size": image.size,
+        "timings": timings,
+    }
+    return PreparedImage({"mime_type": "image/jpeg", "data": data}, image, stats)
+
+
+def describe(stats: dict) -> str:
+    return (
+        f"{stats['original_size'][0]}x{stats['original_size'][1]} -> "
+        f"{stats['prepared_size'][0]}x{stats['prepared_size'][1]}, "
+        f"{stats['original_bytes'] / 1024:.0f} KB -> {stats['prepared_bytes'] / 1024:.0f} KB, "
+        f"timings {stats['timings']}"
+    )
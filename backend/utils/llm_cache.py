@@ -0,0 +1,65 @@
+import os
+import json
+import hashlib
+from dotenv import load_dotenv
+from utils import tiered_cache
+
+load_dotenv()
+
+# Content-addressed cache for LLM analysis results.
+# Memory and SQLite tiers (utils/tiered_cache.py), bounded by entry counts,
+# with the same TTL on both tiers. cache.get/set block on SQLite; call them
+# through asyncio.to_thread.
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(BACKEND_DIR, ".cache", "llm_cache.sqlite3"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512"))
+LLM_CACHE_DISK_MAX_ENTRIES = int(os.getenv("LLM_CACHE_DISK_MAX_ENTRIES", "10000"))
+LLM_CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def normalize_context(context: str | None):
+    """Parses the `context` form field so key order and whitespace don't change the key."""
+    if not context:
+        return None
+    try:
+        return json.loads(context)
+    except Exception:
+        return context.strip()
+
+
+def make_key(prompt_version: str, model_name: str, inputs: dict, generation_config: dict | None = None) -> str:
+    payload = json.dumps(
+        {
+            "prompt_version": prompt_version,
+            "model": model_name,
+            "inputs": inputs,
+            "generation_config": generation_config or {},
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+cache = (
+    tiered_cache.TieredCache(
+        "LLM Cache",
+        LLM_CACHE_PATH,
+        "llm_cache",
+        encode=lambda value: json.dumps(value, ensure_ascii=False),
+        decode=json.loads,
+        ttl_seconds=LLM_CACHE_TTL_SECONDS,
+        max_entries=LLM_CACHE_MAX_ENTRIES,
+        disk_max_entries=LLM_CACHE_DISK_MAX_ENTRIES,
+    )
+    if LLM_CACHE_ENABLED
+    else tiered_cache.DisabledCache()
+)
@@ -0,0 +1,65 @@
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import google.generativeai as genai
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Single entry point for every Gemini call made by the API.
+# The google-generativeai client is synchronous, so calls run on a bounded
+# thread pool and the event loop stays free for logins, registry reads, etc.
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-flash-latest")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "300"))
+
+# Ensure GOOGLE_API_KEY is set in your .env file
+genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+
+# Use a model that supports both text and vision
+model = genai.GenerativeModel(GEMINI_MODEL_NAME)
+
+_executor = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix="gemini")
+_semaphore: asyncio.Semaphore | None = None
+_in_flight = 0
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _semaphore
+
+
+async def generate_content(parts, generation_config=None):
+    """
+    Non-blocking replacement for model.generate_content.
+    At most LLM_MAX_CONCURRENCY calls run at once; the rest wait on the semaphore.
+    """
+    global _in_flight
+    loop = asyncio.get_running_loop()
+    call = functools.partial(
+        model.generate_content,
+        parts,
+        generation_config=generation_config,
+        request_options={"timeout": LLM_TIMEOUT_SECONDS},
+    )
+    async with _get_semaphore():
+        _in_flight += 1
+        try:
+            return await loop.run_in_executor(_executor, call)
+        finally:
+            _in_flight -= 1
+
+
+def get_stats() -> dict:
+    return {
+        "model": GEMINI_MODEL_NAME,
+        "max_concurrency": LLM_MAX_CONCURRENCY,
+        "in_flight": _in_flight,
+    }
+
+
+def shutdown():
+    _executor.shutdown(wait=False, cancel_futures=True)
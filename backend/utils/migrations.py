@@ -0,0 +1,153 @@
+from datetime import datetime
+from sqlalchemy import inspect, text
+from sqlmodel import SQLModel, Session
+import models  # noqa: F401  registers every table on SQLModel.metadata
+from utils import analysis_rows, rollups, search
+
+# Versioned schema migrations.
+# Pending steps run in one transaction and are recorded in `schema_version`.
+# upgrade() first reads only the recorded version, so an up-to-date database is
+# neither reflected nor locked at startup. Steps must be safe on databases that
+# were created or patched by the old migrate_*.py scripts, hence the IF NOT EXISTS
+# checks. Append new steps; never edit or renumber applied ones.
+
+# Arbitrary constant for pg_advisory_xact_lock, so concurrent workers don't migrate twice
+MIGRATION_LOCK_KEY = 7_204_311
+
+
+def _add_missing_columns(conn, table: str, columns: list[tuple[str, str]]):
+    existing = {c["name"] for c in inspect(conn).get_columns(table)}
+    for name, ddl_type in columns:
+        if name not in existing:
+            print(f"Migrations: adding {table}.{name}")
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl_type}"))
+
+
+def _create_tables(conn):
+    SQLModel.metadata.create_all(conn)
+
+
+def _residuo_columns(conn):
+    # Formerly migrate_pg.py, migrate_financials.py, migrate_new_fields.py and migrate_fingerprint.py
+    _add_missing_columns(conn, "residuo", [
+        ("analysis_material_name", "TEXT"),
+        ("analysis_physicochemical", "TEXT"),
+        ("analysis_elemental", "TEXT"),
+        ("analysis_engineering", "TEXT"),
+        ("analysis_valorization", "TEXT"),
+        ("razon_social", "VARCHAR"),
+        ("planta", "VARCHAR"),
+        ("departamento", "VARCHAR"),
+        ("codigo_basilea", "VARCHAR"),
+        ("costo_disposicion_final", "FLOAT DEFAULT 0.0"),
+        ("ingreso_economia_circular", "FLOAT DEFAULT 0.0"),
+        ("oportunidades_ec", "TEXT"),
+        ("viabilidad_ec", "FLOAT DEFAULT 0.0"),
+        ("recla_no_peligroso", "TEXT"),
+        ("viabilidad_reclasificacion", "FLOAT DEFAULT 0.0"),
+        ("tratamiento", "TEXT"),
+        ("fingerprint", "VARCHAR(64)"),
+    ])
+    if conn.dialect.name == "postgresql":
+        # Formerly migrate_db.py
+        for statement in (
+            "ALTER TABLE residuo ALTER COLUMN volumen DROP NOT NULL",
+            "ALTER TABLE residuo ALTER COLUMN frecuencia DROP NOT NULL",
+            "ALTER TABLE residuo ALTER COLUMN analysis_physicochemical TYPE TEXT",
+            "ALTER TABLE residuo ALTER COLUMN analysis_elemental TYPE TEXT",
+            "ALTER TABLE residuo ALTER COLUMN analysis_engineering TYPE TEXT",
+            "ALTER TABLE residuo ALTER COLUMN analysis_valorization TYPE TEXT",
+        ):
+            conn.execute(text(statement))
+
+
+def _residuo_indexes(conn):
+    for statement in (
+        "CREATE UNIQUE INDEX IF NOT EXISTS ix_residuo_fingerprint ON residuo (fingerprint)",
+        # Newest-first listing and keyset pagination (GET /waste/generation), date filters
+        "CREATE INDEX IF NOT EXISTS ix_residuo_fecha_registro_id ON residuo (fecha_registro, id)",
+        "CREATE INDEX IF NOT EXISTS ix_residuo_tipo_residuo ON residuo (tipo_residuo)",
+        "CREATE INDEX IF NOT EXISTS ix_residuo_codigo_basilea ON residuo (codigo_basilea)",
+        "CREATE INDEX IF NOT EXISTS ix_residuo_unidad_generadora ON residuo (unidad_generadora)",
+        "CREATE INDEX IF NOT EXISTS ix_residuo_razon_social ON residuo (razon_social)",
+    ):
+        conn.execute(text(statement))
+
+
+def _backfill_rollups(conn):
+    with Session(bind=conn, join_transaction_mode="create_savepoint") as session:
+        count = rollups.rebuild(session)
+        session.commit()
+    print(f"Migrations: backfilled {count} rollup rows")
+
+
+def _backfill_analysis_rows(conn):
+    # Step 1 already creates the child tables on databases migrated after they were added
+    SQLModel.metadata.create_all(conn, tables=[
+        models.ResiduoElemento.__table__, models.ResiduoPropiedad.__table__, models.ResiduoRuta.__table__,
+    ])
+    with Session(bind=conn, join_transaction_mode="create_savepoint") as session:
+        count = analysis_rows.rebuild(session)
+        session.commit()
+    print(f"Migrations: backfilled {count} analysis child rows")
+
+
+MIGRATIONS = [
+    (1, "Create missing tables", _create_tables),
+    (2, "Add residuo columns introduced after the first release", _residuo_columns),
+    (3, "Add residuo hot-path indexes", _residuo_indexes),
+    (4, "Backfill residuo_rollup", _backfill_rollups),
+    (5, "Create and backfill residuo analysis child tables", _backfill_analysis_rows),
+    (6, "Add residuo full-text search index", search.create_index),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def _recorded_version(conn) -> int | None:
+    """Highest applied version, or None when the database has never been migrated."""
+    if not inspect(conn).has_table("schema_version"):
+        return None
+    return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+
+
+def current_version(engine) -> int | None:
+    with engine.connect() as conn:
+        return _recorded_version(conn)
+
+
+def upgrade(engine) -> int:
+    """Applies pending migrations. Returns the schema version afterwards."""
+    # Fast path: a single-row read, no reflection and no lock
+    try:
+        with engine.connect() as conn:
+            version = conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar()
+        if version == LATEST_VERSION:
+            print(f"Migrations: schema at version {version}, nothing to do")
+            return version
+    except Exception:
+        pass  # schema_version does not exist yet
+
+    with engine.begin() as conn:
+        if conn.dialect.name == "postgresql":
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        conn.execute(text(
+            "CREATE TABLE IF NOT EXISTS schema_version ("
+            "version INTEGER PRIMARY KEY, description VARCHAR NOT NULL, applied_at TIMESTAMP NOT NULL)"
+        ))
+        # Re-read under the lock: another worker may have migrated meanwhile
+        version = _recorded_version(conn) or 0
+        if version > LATEST_VERSION:
+            print(f"Migrations: database is at version {version}, newer than this code ({LATEST_VERSION})")
+            return version
+        for step_version, description, step in MIGRATIONS:
+            if step_version <= version:
+                continue
+            print(f"Migrations: applying {step_version} - {description}")
+            step(conn)
+            conn.execute(
+                text("INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, :t)"),
+                {"v": step_version, "d": description, "t": datetime.now()},
+            )
+            version = step_version
+    print(f"Migrations: schema at version {version}")
+    return version
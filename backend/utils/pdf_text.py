@@ -0,0 +1,180 @@
+import os
+import io
+import math
+import signal
+import asyncio
+import tempfile
+import contextlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import pypdf
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Shared PDF text extraction service.
+# pypdf's extract_text is pure Python and CPU-bound, so large documents are split
+# into page ranges and parsed on a process pool instead of inside the event loop.
+# Every range goes to the pool, where the per-page timeout can be enforced; the
+# document is written once to a temp file that the workers open, instead of
+# pickling its bytes into every task.
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(min(4, os.cpu_count() or 1))))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+PDF_PAGE_TIMEOUT_SECONDS = float(os.getenv("PDF_PAGE_TIMEOUT_SECONDS", "10"))
+# First batch of iter_pages(); small so the first pages arrive quickly
+PDF_FIRST_BATCH_PAGES = int(os.getenv("PDF_FIRST_BATCH_PAGES", "8"))
+
+_pool: ProcessPoolExecutor | None = None
+
+
+class PageTimeout(Exception):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise PageTimeout()
+
+
+def extract_page_range(source: bytes | str, start: int, stop: int, page_timeout: float = 0) -> list[str]:
+    """
+    Text of pages [start, stop), in order, from PDF bytes or a file path. A page
+    that fails or exceeds `page_timeout` seconds yields "" instead of failing the
+    whole document. The timeout relies on SIGALRM, so it only applies in a
+    worker's main thread.
+    """
+    reader = pypdf.PdfReader(source if isinstance(source, str) else io.BytesIO(source))
+    stop = min(stop, len(reader.pages))
+    use_alarm = (
+        page_timeout > 0
+        and hasattr(signal, "setitimer")
+        and threading.current_thread() is threading.main_thread()
+    )
+    previous_handler = signal.signal(signal.SIGALRM, _on_alarm) if use_alarm else None
+
+    texts = []
+    try:
+        for i in range(start, stop):
+            try:
+                if use_alarm:
+                    signal.setitimer(signal.ITIMER_REAL, page_timeout)
+                texts.append(reader.pages[i].extract_text() or "")
+            except PageTimeout:
+                print(f"PDF Extract: page {i + 1} exceeded {page_timeout}s, skipped")
+                texts.append("")
+            except Exception as e:
+                print(f"PDF Extract: page {i + 1} failed: {e}")
+                texts.append("")
+            finally:
+                if use_alarm:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+    finally:
+        if use_alarm:
+            signal.signal(signal.SIGALRM, previous_handler)
+    return texts
+
+
+def count_pages(content: bytes) -> int:
+    """Raises if `content` is not a readable PDF."""
+    return len(pypdf.PdfReader(io.BytesIO(content)).pages)
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: the API process runs thread pools, which don't survive a fork safely
+        context = multiprocessing.get_context(os.getenv("PDF_EXTRACT_START_METHOD", "spawn"))
+        _pool = ProcessPoolExecutor(max_workers=max(PDF_EXTRACT_WORKERS, 1), mp_context=context)
+    return _pool
+
+
+def split_ranges(start: int, stop: int, workers: int, max_pages_per_task: int) -> list[tuple[int, int]]:
+    size = max(1, min(max_pages_per_task, math.ceil((stop - start) / max(workers, 1))))
+    return [(i, min(i + size, stop)) for i in range(start, stop, size)]
+
+
+def _write_temp(content: bytes) -> str:
+    with tempfile.NamedTemporaryFile(prefix="pdf_extract_", suffix=".pdf", delete=False) as f:
+        f.write(content)
+        return f.name
+
+
+@contextlib.asynccontextmanager
+async def spooled(content: bytes):
+    """Path of a temp copy of `content` for the pool workers, removed afterwards."""
+    path = await asyncio.to_thread(_write_temp, content)
+    try:
+        yield path
+    finally:
+        with contextlib.suppress(OSError):
+            os.unlink(path)
+
+
+async def _extract_file_pages(path: str, start: int, stop: int) -> list[str]:
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    ranges = split_ranges(start, stop, PDF_EXTRACT_WORKERS, PDF_PAGES_PER_TASK)
+    results = await asyncio.gather(*(
+        loop.run_in_executor(pool, extract_page_range, path, a, b, PDF_PAGE_TIMEOUT_SECONDS)
+        for a, b in ranges
+    ))
+    return [text for chunk in results for text in chunk]
+
+
+async def extract_pages(content: bytes, start: int = 0, stop: int | None = None, total_pages: int | None = None) -> list[str]:
+    """Per-page text for pages [start, stop), in page order, without blocking the event loop."""
+    if total_pages is None:
+        total_pages = await asyncio.to_thread(count_pages, content)
+    stop = total_pages if stop is None else min(stop, total_pages)
+    if stop <= start:
+        return []
+    async with spooled(content) as path:
+        return await _extract_file_pages(path, start, stop)
+
+
+async def iter_pages(content: bytes, max_chars: int | None = None, total_pages: int | None = None):
+    """
+    Async generator over page texts in page order, parsed in batches on the pool.
+    With `max_chars`, parsing stops as soon as that many characters have been
+    produced, so a 300-page dossier capped at 20k chars only parses its first pages.
+    """
+    if total_pages is None:
+        total_pages = await asyncio.to_thread(count_pages, content)
+    max_batch = max(PDF_FIRST_BATCH_PAGES, PDF_EXTRACT_WORKERS * PDF_PAGES_PER_TASK)
+    # Never fewer pages than workers, so even a capped read keeps the whole pool busy
+    min_batch = max(PDF_EXTRACT_WORKERS, 1)
+    # A small first batch keeps time-to-first-page low; later batches fill the pool
+    batch = max(PDF_FIRST_BATCH_PAGES, min_batch)
+    produced = 0
+    start = 0
+    async with spooled(content) as path:
+        while start < total_pages:
+            stop = min(start + batch, total_pages)
+            for text in await _extract_file_pages(path, start, stop):
+                yield text
+                produced += len(text) + 1
+                if max_chars is not None and produced >= max_chars:
+                    return
+            start = stop
+            if max_chars is None:
+                batch = max_batch
+            else:
+                # Size the next batch from the average page length seen so far
+                avg_chars = max(produced / start, 1)
+                batch = max(min_batch, min(max_batch, math.ceil((max_chars - produced) / avg_chars)))
+
+
+async def read_text(content: bytes, max_chars: int) -> str:
+    """Newline-joined document text, truncated to `max_chars`."""
+    parts = []
+    async for text in iter_pages(content, max_chars=max_chars):
+        parts.append(text)
+        parts.append("\n")
+    return "".join(parts)[:max_chars]
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
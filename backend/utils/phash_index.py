@@ -0,0 +1,144 @@
+import os
+import json
+import threading
+from PIL import Image
+from dotenv import load_dotenv
+from utils import llm_cache, tiered_cache
+
+load_dotenv()
+
+# Near-duplicate detection for photo analyses.
+# Each analyzed photo is stored with its 64-bit difference hash (dHash) in a
+# BK-tree, so "any past photo within N bits" is answered without a full scan.
+# Results are replayed like cached LLM answers, so they share LLM_CACHE_TTL_SECONDS.
+# The methods block on SQLite; call them through asyncio.to_thread.
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PHASH_ENABLED = os.getenv("PHASH_ENABLED", "true").lower() not in ("0", "false", "no")
+PHASH_INDEX_PATH = os.getenv("PHASH_INDEX_PATH", os.path.join(BACKEND_DIR, ".cache", "photo_hashes.sqlite3"))
+PHASH_MAX_DISTANCE = int(os.getenv("PHASH_MAX_DISTANCE", "6"))
+PHASH_MAX_ENTRIES = int(os.getenv("PHASH_MAX_ENTRIES", "10000"))
+PHASH_MEMORY_ENTRIES = int(os.getenv("PHASH_MEMORY_ENTRIES", "256"))
+
+
+def dhash(image: Image.Image, hash_size: int = 8) -> int:
+    """Difference hash: one bit per horizontally adjacent pixel pair of a 9x8 grayscale thumbnail."""
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class BKTree:
+    """Burkhard-Keller tree over integer hashes with Hamming distance."""
+
+    def __init__(self):
+        self.root = None  # [hash, payloads, {distance: child}]
+        self.size = 0
+
+    def add(self, value: int, payload):
+        self.size += 1
+        if self.root is None:
+            self.root = [value, [payload], {}]
+            return
+        node = self.root
+        while True:
+            d = hamming(value, node[0])
+            if d == 0:
+                node[1].append(payload)
+                return
+            child = node[2].get(d)
+            if child is None:
+                node[2][d] = [value, [payload], {}]
+                return
+            node = child
+
+    def query(self, value: int, max_distance: int) -> list[tuple[int, object]]:
+        """All (distance, payload) pairs within `max_distance` bits of `value`."""
+        matches = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            d = hamming(value, node[0])
+            if d <= max_distance:
+                matches.extend((d, payload) for payload in node[1])
+            # Triangle inequality: only subtrees at distance d±max_distance can hold matches
+            for child_d, child in node[2].items():
+                if d - max_distance <= child_d <= d + max_distance:
+                    stack.append(child)
+        return matches
+
+
+class PhotoHashIndex:
+    """
+    BK-tree over the hashes of the photos stored in `store`, keyed "<hash>:<context key>".
+    Entries expire and are evicted by the store; the tree is rebuilt from the live
+    keys once it holds twice the store's budget, so it stays bounded too.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.tree = BKTree()
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    def _rebuild(self):
+        tree = BKTree()
+        for key in self.store.keys():
+            hash_hex, _, context_key = key.partition(":")
+            tree.add(int(hash_hex, 16), key)
+        self.tree = tree
+        self._loaded = True
+
+    def load(self):
+        with self._lock:
+            self._rebuild()
+        print(f"Photo Hash Index: loaded {self.tree.size} photos")
+
+    def find(self, image_hash: int, context_key: str, max_distance: int = PHASH_MAX_DISTANCE):
+        """Closest live result for the same context within `max_distance` bits, as (distance, result)."""
+        with self._lock:
+            if not self._loaded:
+                self._rebuild()
+            matches = sorted(
+                (d, key) for d, key in self.tree.query(image_hash, max_distance)
+                if key.endswith(f":{context_key}")
+            )
+        for distance, key in matches:
+            result = self.store.get(key)
+            if result is not None:
+                return distance, result
+        return None
+
+    def add(self, image_hash: int, context_key: str, result: dict):
+        key = f"{image_hash:016x}:{context_key}"
+        self.store.set(key, result)
+        with self._lock:
+            if not self._loaded or self.tree.size >= 2 * PHASH_MAX_ENTRIES:
+                self._rebuild()
+            else:
+                self.tree.add(image_hash, key)
+
+
+index = (
+    PhotoHashIndex(tiered_cache.TieredCache(
+        "Photo Hash Index",
+        PHASH_INDEX_PATH,
+        "photo_hashes",
+        encode=lambda value: json.dumps(value, ensure_ascii=False),
+        decode=json.loads,
+        ttl_seconds=llm_cache.LLM_CACHE_TTL_SECONDS,
+        max_entries=PHASH_MEMORY_ENTRIES,
+        disk_max_entries=PHASH_MAX_ENTRIES,
+    ))
+    if PHASH_ENABLED
+    else None
+)
@@ -0,0 +1,72 @@
+import os
+import json
+import hashlib
+from typing import Callable, NamedTuple
+from io import BytesIO
+from pydantic import BaseModel
+from dotenv import load_dotenv
+from utils import tiered_cache
+
+load_dotenv()
+
+# Cache of rendered PDF reports (/report, /predictive-report).
+# The key hashes the canonical JSON of the request payload together with the
+# report kind and REPORT_TEMPLATE_VERSION, so changing the template invalidates
+# everything. Memory and SQLite tiers (utils/tiered_cache.py), each with its own
+# byte budget, so repeat downloads survive restarts.
+# The key doubles as the response ETag.
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+REPORT_CACHE_ENABLED = os.getenv("REPORT_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+REPORT_CACHE_PATH = os.getenv("REPORT_CACHE_PATH", os.path.join(BACKEND_DIR, ".cache", "report_cache.sqlite3"))
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+REPORT_CACHE_DISK_MAX_BYTES = int(os.getenv("REPORT_CACHE_DISK_MAX_BYTES", str(512 * 1024 * 1024)))
+
+
+class RenderedReport(NamedTuple):
+    pdf: bytes
+    etag: str
+    cached: bool
+
+
+def make_key(kind: str, template_version: str, payload: BaseModel) -> str:
+    canonical = json.dumps(
+        {"kind": kind, "template": template_version, "payload": payload.model_dump(mode="json")},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def etag_for(key: str) -> str:
+    return f'"{key}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates or "*" in candidates
+
+
+cache = (
+    tiered_cache.TieredCache(
+        "Report Cache",
+        REPORT_CACHE_PATH,
+        "report_cache",
+        max_bytes=REPORT_CACHE_MAX_BYTES,
+        disk_max_bytes=REPORT_CACHE_DISK_MAX_BYTES,
+    )
+    if REPORT_CACHE_ENABLED
+    else tiered_cache.DisabledCache()
+)
+
+
+def get_or_render(key: str, render: Callable[[], BytesIO]) -> RenderedReport:
+    pdf = cache.get(key)
+    if pdf is not None:
+        return RenderedReport(pdf, etag_for(key), True)
+    pdf = render().getvalue()
+    cache.set(key, pdf)
+    return RenderedReport(pdf, etag_for(key), False)
@@ -1,56 +1,211 @@
 from io import BytesIO
+from functools import lru_cache
+from typing import NamedTuple
+import threading
+from PIL import Image as PILImage
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
+from reportlab.lib.utils import ImageReader
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Flowable
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.graphics import renderPDF
+from reportlab.graphics.shapes import Drawing, Line, Rect, String
 from models import AnalysisResult
 import os
 
+# Part of the report cache key (utils/report_cache.py); bump when the layout changes
+REPORT_TEMPLATE_VERSION = "3"
+
+# Report template: style sheets, table styles and the logo are built once
+# (warmup() at startup, or lazily on the first report) and shared by every
+# report, so generating one only lays out the data. Styles are never mutated
+# after they are built, which makes sharing them across requests safe.
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROJECT_ROOT = os.path.dirname(BACKEND_DIR)
+LOGO_CANDIDATES = (
+    os.path.join(BACKEND_DIR, "logocerebro.png"),  # deployed with a flat structure
+    os.path.join(PROJECT_ROOT, "static", "logocerebro.png"),  # dev environment
+)
+LOGO_BOX = (200, 50)  # points; the logo is scaled proportionally into this box
+LOGO_PIXELS_PER_POINT = 3  # ~216 dpi, sharp in print without embedding the full-size PNG
+
+
+class CachedImage(Flowable):
+    """Draws a shared, already decoded ImageReader at a fixed size."""
+
+    def __init__(self, reader: ImageReader, width: float, height: float, hAlign: str = "LEFT"):
+        super().__init__()
+        self.reader = reader
+        self.width = width
+        self.height = height
+        self.hAlign = hAlign
+
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+
+    def draw(self):
+        self.canv.drawImage(self.reader, 0, 0, self.width, self.height, mask="auto")
+
+
+class SharedDrawing(Flowable):
+    """Renders a memoized Drawing without touching it, so one instance can serve every report."""
+
+    def __init__(self, drawing: Drawing):
+        super().__init__()
+        self.drawing = drawing
+        self.width = drawing.width
+        self.height = drawing.height
+
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+
+    def draw(self):
+        renderPDF.draw(self.drawing, self.canv, 0, 0)
+
+
+@lru_cache(maxsize=256)
+def durability_chart(score: float) -> Drawing:
+    """Horizontal 0-100 bar for the durability score, as vector graphics (400 x 100 pt)."""
+    drawing = Drawing(400, 100)
+    left, right, bottom, top = 75, 385, 22, 78
+    drawing.add(String(
+        (left + right) / 2, 86, f"Score de Durabilidad: {score}/100",
+        fontName="Helvetica", fontSize=10, textAnchor="middle",
+    ))
+    bar_height = (top - bottom) * 0.45
+    bar_y = (top + bottom - bar_height) / 2
+    bar_width = (right - left) * min(max(score, 0.0), 100.0) / 100
+    if bar_width > 0:
+        drawing.add(Rect(left, bar_y, bar_width, bar_height, fillColor=colors.HexColor("#3B82F6"), strokeColor=None))
+    drawing.add(Rect(left, bottom, right - left, top - bottom, fillColor=None, strokeColor=colors.black, strokeWidth=0.6))
+    drawing.add(String(left - 5, bar_y + bar_height / 2 - 3, "Durabilidad", fontName="Helvetica", fontSize=8, textAnchor="end"))
+    for tick in range(0, 101, 20):
+        x = left + (right - left) * tick / 100
+        drawing.add(Line(x, bottom, x, bottom - 3, strokeColor=colors.black, strokeWidth=0.6))
+        drawing.add(String(x, bottom - 12, str(tick), fontName="Helvetica", fontSize=8, textAnchor="middle"))
+    return drawing
+
+
+class ReportTemplate(NamedTuple):
+    styles: object  # reportlab StyleSheet1
+    italic: ParagraphStyle
+    cell: ParagraphStyle
+    impact: dict[str, ParagraphStyle]  # "high" / "medium" / "low"
+    physicochemical_table: TableStyle
+    summary_table: TableStyle
+    impact_table: TableStyle
+    action_table: TableStyle
+    compliance_table: TableStyle
+    logo: tuple[ImageReader, float, float] | None
+
+
+def _load_logo() -> tuple[ImageReader, float, float] | None:
+    logo_path = next((path for path in LOGO_CANDIDATES if os.path.exists(path)), None)
+    if logo_path is None:
+        print(f"Warning: Logo not found in {LOGO_CANDIDATES}")
+        return None
+    with PILImage.open(logo_path) as im:
+        im.load()
+        factor = min(LOGO_BOX[0] / im.width, LOGO_BOX[1] / im.height)
+        width, height = im.width * factor, im.height * factor
+        pixels = (round(width * LOGO_PIXELS_PER_POINT), round(height * LOGO_PIXELS_PER_POINT))
+        if pixels[0] < im.width:
+            im = im.resize(pixels, PILImage.LANCZOS)
+        else:
+            im = im.copy()
+    reader = ImageReader(im)
+    reader.getRGBData()  # decode now instead of on the first report
+    return reader, width, height
+
+
+def build_template() -> ReportTemplate:
+    styles = getSampleStyleSheet()
+    impact = {
+        level: ParagraphStyle(f"Impact{level.title()}", parent=styles['Normal'], textColor=color, fontName='Helvetica-Bold')
+        for level, color in (("high", colors.red), ("medium", colors.orange), ("low", colors.green))
+    }
+    return ReportTemplate(
+        styles=styles,
+        italic=ParagraphStyle('ItalicStyle', parent=styles['BodyText'], fontName='Helvetica-Oblique'),
+        cell=ParagraphStyle('CellStyle', parent=styles['BodyText'], fontSize=9, leading=11, spaceAfter=0),
+        impact=impact,
+        physicochemical_table=TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('LEFTPADDING', (0, 0), (-1, -1), 6),
+            ('RIGHTPADDING', (0, 0), (-1, -1), 6),
+            ('TOPPADDING', (0, 0), (-1, -1), 6),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ]),
+        summary_table=TableStyle([
+            ('BACKGROUND', (0,0), (0,-1), colors.HexColor('#F3F4F6')),
+            ('TEXTCOLOR', (0,0), (0,-1), colors.black),
+            ('FONTNAME', (0,0), (0,-1), 'Helvetica-Bold'),
+            ('GRID', (0,0), (-1,-1), 1, colors.grey),
+            ('PADDING', (0,0), (-1,-1), 6),
+            ('VALIGN', (0,0), (-1,-1), 'TOP'), # Align top for multiline
+        ]),
+        impact_table=TableStyle([
+            ('GRID', (0,0), (-1,-1), 0.5, colors.grey),
+            ('FONTNAME', (0,0), (0,-1), 'Helvetica-Bold'),
+            ('VALIGN', (0,0), (-1,-1), 'TOP'),
+            ('PADDING', (0,0), (-1,-1), 6),
+        ]),
+        action_table=TableStyle([('BACKGROUND', (0,0), (-1,-1), colors.HexColor('#FEF3C7')), ('BOX', (0,0), (-1,-1), 1, colors.orange)]),
+        compliance_table=TableStyle([
+            ('GRID', (0,0), (-1,-1), 0.5, colors.grey),
+            ('BACKGROUND', (0,0), (0,-1), colors.HexColor('#F3F4F6')),
+            ('FONTNAME', (0,0), (0,-1), 'Helvetica-Bold'),
+            ('VALIGN', (0,0), (-1,-1), 'TOP'),
+            ('PADDING', (0,0), (-1,-1), 6),
+        ]),
+        logo=_load_logo(),
+    )
+
+
+_template: ReportTemplate | None = None
+_template_lock = threading.Lock()
+
+
+def get_template() -> ReportTemplate:
+    global _template
+    if _template is None:
+        with _template_lock:
+            if _template is None:
+                _template = build_template()
+    return _template
+
+
+def warmup():
+    """Builds the shared template so the first report request doesn't pay for it."""
+    template = get_template()
+    print(f"Reports: template ready (logo {'loaded' if template.logo else 'missing'})")
+
+
+def _logo_flowables(template: ReportTemplate) -> list:
+    if template.logo is None:
+        return []
+    reader, width, height = template.logo
+    return [CachedImage(reader, width, height), Spacer(1, 12)]
+
+
 def generate_pdf_report(data: AnalysisResult) -> BytesIO:
+    template = get_template()
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=letter)
-    styles = getSampleStyleSheet()
-    story = []
+    styles = template.styles
+    story = _logo_flowables(template)
 
-    # Logo Logic
-    # File structure:
-    # project_root/
-    #   backend/utils/report_generator.py
-    #   static/logocerebro.png
-    
-    current_dir = os.path.dirname(os.path.abspath(__file__)) # utils
-    backend_dir = os.path.dirname(current_dir) # backend
-    project_root = os.path.dirname(backend_dir) # project_root
-    
-    # Try finding logo in static folder first
-    logo_path = os.path.join(project_root, "static", "logocerebro.png")
-    
-    # Fallback to backend dir if deployed with flat structure
-    if not os.path.exists(logo_path):
-        logo_path = os.path.join(backend_dir, "logocerebro.png")
-    
-    print(f"DEBUG: Calculated Logo Path: {logo_path}")
-    print(f"DEBUG: File Exists? {os.path.exists(logo_path)}")
-
-    if os.path.exists(logo_path):
-        im = Image(logo_path, width=200, height=50, kind='proportional') 
-        im.hAlign = 'LEFT'
-        story.append(im)
-        story.append(Spacer(1, 12))
-    else:
-        print(f"Warning: Logo not found at {logo_path}")
-
-    # Custom Styles
     title_style = styles['Title']
     heading_style = styles['Heading2']
     normal_style = styles['BodyText']
-    
-    # Define italics style for summary
-    italic_style = ParagraphStyle(
-        'ItalicStyle',
-        parent=styles['BodyText'],
-        fontName='Helvetica-Oblique'
-    )
+    italic_style = template.italic
 
     # Title
     story.append(Paragraph("Informe Técnico de Caracterización", title_style))
@@ -76,14 +231,7 @@ def generate_pdf_report(data: AnalysisResult) -> BytesIO:
     
     table_data = [["Propiedad", "Valor", "Método"]]
     
-    # Define a custom style for table cells
-    cell_style = ParagraphStyle(
-        'CellStyle',
-        parent=styles['BodyText'],
-        fontSize=9,
-        leading=11,
-        spaceAfter=0,
-    )
+    cell_style = template.cell
 
     for prop in data.physicochemical:
         # Wrap each cell content in a Paragraph to allow multiline
@@ -96,20 +244,7 @@ def generate_pdf_report(data: AnalysisResult) -> BytesIO:
 
     # Allow row heights to be automatic based on content
     t = Table(table_data, colWidths=[200, 150, 100])
-    t.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('LEFTPADDING', (0, 0), (-1, -1), 6),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 6),
-        ('TOPPADDING', (0, 0), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-    ]))
+    t.setStyle(template.physicochemical_table)
     story.append(t)
     story.append(Spacer(1, 12))
 
@@ -142,34 +277,14 @@ def generate_pdf_report(data: AnalysisResult) -> BytesIO:
     buffer.seek(0)
     return buffer
 
-import matplotlib.pyplot as plt
-import matplotlib
-matplotlib.use('Agg') # Non-interactive backend
 from models import PredictiveAnalysisResult
 
 def generate_predictive_report(data: PredictiveAnalysisResult) -> BytesIO:
+    template = get_template()
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=letter)
-    styles = getSampleStyleSheet()
-    story = []
-
-    # --- Header & Logo ---
-    current_dir = os.path.dirname(os.path.abspath(__file__)) # utils
-    backend_dir = os.path.dirname(current_dir) # backend
-    project_root = os.path.dirname(backend_dir) # project_root
-
-    # 1. Look in backend dir (safest for deployment)
-    logo_path = os.path.join(backend_dir, "logocerebro.png")
-    
-    # 2. Fallback to project root static (dev environment)
-    if not os.path.exists(logo_path):
-        logo_path = os.path.join(project_root, "static", "logocerebro.png")
-
-    if os.path.exists(logo_path):
-        im = Image(logo_path, width=200, height=50, kind='proportional') 
-        im.hAlign = 'LEFT'
-        story.append(im)
-        story.append(Spacer(1, 12))
+    styles = template.styles
+    story = _logo_flowables(template)
 
     story.append(Paragraph(f"Informe de Predicción Inteligente: {data.productOverview.productName}", styles['Title']))
     story.append(Paragraph("Evaluación de Ciclo de Vida y Economía Circular", styles['Italic']))
@@ -187,14 +302,7 @@ def generate_predictive_report(data: PredictiveAnalysisResult) -> BytesIO:
         ["Contenido Detectado", p_cont]
     ]
     t_summary = Table(data_summary, colWidths=[150, 300])
-    t_summary.setStyle(TableStyle([
-        ('BACKGROUND', (0,0), (0,-1), colors.HexColor('#F3F4F6')),
-        ('TEXTCOLOR', (0,0), (0,-1), colors.black),
-        ('FONTNAME', (0,0), (0,-1), 'Helvetica-Bold'),
-        ('GRID', (0,0), (-1,-1), 1, colors.grey),
-        ('PADDING', (0,0), (-1,-1), 6),
-        ('VALIGN', (0,0), (-1,-1), 'TOP'), # Align top for multiline
-    ]))
+    t_summary.setStyle(template.summary_table)
     story.append(t_summary)
     story.append(Spacer(1, 20))
 
@@ -202,19 +310,7 @@ def generate_predictive_report(data: PredictiveAnalysisResult) -> BytesIO:
     story.append(Paragraph("1. Métricas de Ciclo de Vida", styles['Heading2']))
     story.append(Paragraph(f"Vida Útil Estimada: {data.lifecycleMetrics.estimatedLifespan}", styles['Normal']))
     
-    # Generate Horizontal Bar Chart for Durability
-    plt.figure(figsize=(6, 1.5))
-    plt.barh(['Durabilidad'], [data.lifecycleMetrics.durabilityScore], color='#3B82F6', height=0.5)
-    plt.xlim(0, 100)
-    plt.title(f"Score de Durabilidad: {data.lifecycleMetrics.durabilityScore}/100")
-    plt.tight_layout()
-    
-    img_buffer = BytesIO()
-    plt.savefig(img_buffer, format='png', dpi=100)
-    img_buffer.seek(0)
-    plt.close()
-    
-    story.append(Image(img_buffer, width=400, height=100))
+    story.append(SharedDrawing(durability_chart(data.lifecycleMetrics.durabilityScore)))
     story.append(Paragraph("<i>* 0-30: Bajo (Un uso) | 31-70: Medio (Reciclable) | 71-100: Alto (Reutilizable/Durable)</i>", styles['Normal']))
     story.append(Spacer(1, 6))
     story.append(Paragraph(f"<i>Disposición: {data.lifecycleMetrics.disposalStage}</i>", styles['Normal']))
@@ -223,18 +319,10 @@ def generate_predictive_report(data: PredictiveAnalysisResult) -> BytesIO:
     # --- 2. Environmental Impact ---
     story.append(Paragraph("2. Impacto Ambiental", styles['Heading2']))
     
-    # Helper to create styled paragraphs for the table
     def get_impact_color_style(level):
-        color = colors.green
-        if 'High' in level or 'Alto' in level: color = colors.red
-        elif 'Medium' in level or 'Medio' in level: color = colors.orange
-        
-        return ParagraphStyle(
-            'ImpactStyle',
-            parent=styles['Normal'],
-            textColor=color,
-            fontName='Helvetica-Bold'
-        )
+        if 'High' in level or 'Alto' in level: return template.impact["high"]
+        if 'Medium' in level or 'Medio' in level: return template.impact["medium"]
+        return template.impact["low"]
 
     p_carbon = Paragraph(data.environmentalImpact.carbonFootprintLevel, get_impact_color_style(data.environmentalImpact.carbonFootprintLevel))
     p_hazard = Paragraph(data.environmentalImpact.hazardLevel, styles['Normal'])
@@ -246,12 +334,7 @@ def generate_predictive_report(data: PredictiveAnalysisResult) -> BytesIO:
         ["Potencial Reciclado", p_recycle]
     ]
     t_impact = Table(impact_data, colWidths=[150, 300])
-    t_impact.setStyle(TableStyle([
-        ('GRID', (0,0), (-1,-1), 0.5, colors.grey),
-        ('FONTNAME', (0,0), (0,-1), 'Helvetica-Bold'),
-        ('VALIGN', (0,0), (-1,-1), 'TOP'),
-        ('PADDING', (0,0), (-1,-1), 6),
-    ]))
+    t_impact.setStyle(template.impact_table)
     story.append(t_impact)
     story.append(Spacer(1, 12))
 
@@ -261,9 +344,8 @@ def generate_predictive_report(data: PredictiveAnalysisResult) -> BytesIO:
     
     story.append(Spacer(1, 6))
     p_action = Paragraph(f"Recomendación: {data.economicAnalysis.costBenefitAction}", styles['Normal'])
-    p_action_style = TableStyle([('BACKGROUND', (0,0), (-1,-1), colors.HexColor('#FEF3C7')), ('BOX', (0,0), (-1,-1), 1, colors.orange)])
     t_action = Table([[p_action]], colWidths=[450])
-    t_action.setStyle(p_action_style)
+    t_action.setStyle(template.action_table)
     story.append(t_action)
 
     story.append(Spacer(1, 20))
@@ -288,13 +370,7 @@ def generate_predictive_report(data: PredictiveAnalysisResult) -> BytesIO:
     ]
     
     t_comp = Table(comp_data, colWidths=[150, 300])
-    t_comp.setStyle(TableStyle([
-        ('GRID', (0,0), (-1,-1), 0.5, colors.grey),
-        ('BACKGROUND', (0,0), (0,-1), colors.HexColor('#F3F4F6')),
-        ('FONTNAME', (0,0), (0,-1), 'Helvetica-Bold'),
-        ('VALIGN', (0,0), (-1,-1), 'TOP'),
-        ('PADDING', (0,0), (-1,-1), 6),
-    ]))
+    t_comp.setStyle(template.compliance_table)
     story.append(t_comp)
 
     doc.build(story)
@@ -0,0 +1,116 @@
+import os
+from datetime import timedelta
+from sqlalchemy import delete, func, insert, literal_column
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+from dotenv import load_dotenv
+from models import Residuo, ResiduoRollup, ResiduoFilters
+
+load_dotenv()
+
+# Monthly rollups of the registry for /waste/stats.
+# record() runs inside the same transaction as the Residuo inserts, so a committed
+# registry row is always counted exactly once; rebuild() recomputes the table
+# from scratch for backfills (see rebuild_rollups.py and utils/migrations.py).
+ROLLUPS_ENABLED = os.getenv("ROLLUPS_ENABLED", "true").lower() not in ("0", "false", "no")
+
+KEY_COLUMNS = ("razon_social", "planta", "departamento", "tipo_residuo", "codigo_basilea")
+SUM_COLUMNS = ("peso_total", "costo_disposicion_final", "ingreso_economia_circular")
+UPSERT_CHUNK_SIZE = 500
+
+
+def month_expression(column, dialect_name: str):
+    """'YYYY-MM' of a datetime column in the given SQL dialect."""
+    if dialect_name == "postgresql":
+        return func.to_char(column, literal_column("'YYYY-MM'"))
+    return func.strftime(literal_column("'%Y-%m'"), column)
+
+
+def rollup_key(residuo: Residuo) -> tuple:
+    return (residuo.fecha_registro.strftime("%Y-%m"), *(getattr(residuo, c) or "" for c in KEY_COLUMNS))
+
+
+def record(session: Session, residuos: list[Residuo]):
+    """Adds `residuos` to their rollup rows. Does not commit; call before the caller's commit."""
+    deltas: dict[tuple, list] = {}
+    for residuo in residuos:
+        delta = deltas.setdefault(rollup_key(residuo), [0, 0.0, 0.0, 0.0])
+        delta[0] += 1
+        for i, column in enumerate(SUM_COLUMNS, start=1):
+            delta[i] += getattr(residuo, column) or 0.0
+    if not deltas:
+        return
+
+    rows = [
+        {**dict(zip(("mes", *KEY_COLUMNS), key)), **dict(zip(("registros", *SUM_COLUMNS), delta))}
+        for key, delta in deltas.items()
+    ]
+    dialect_name = session.get_bind().dialect.name
+    if dialect_name not in ("postgresql", "sqlite"):
+        _record_portable(session, rows)
+        return
+
+    dialect_insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    for i in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        statement = dialect_insert(ResiduoRollup).values(rows[i : i + UPSERT_CHUNK_SIZE])
+        statement = statement.on_conflict_do_update(
+            index_elements=["mes", *KEY_COLUMNS],
+            set_={
+                column: getattr(ResiduoRollup, column) + getattr(statement.excluded, column)
+                for column in ("registros", *SUM_COLUMNS)
+            },
+        )
+        session.execute(statement)
+
+
+def _record_portable(session: Session, rows: list[dict]):
+    for row in rows:
+        statement = select(ResiduoRollup).where(ResiduoRollup.mes == row["mes"])
+        for column in KEY_COLUMNS:
+            statement = statement.where(getattr(ResiduoRollup, column) == row[column])
+        existing = session.exec(statement.with_for_update()).first()
+        if existing is None:
+            session.add(ResiduoRollup(**row))
+            continue
+        for column in ("registros", *SUM_COLUMNS):
+            setattr(existing, column, getattr(existing, column) + row[column])
+        session.add(existing)
+    session.flush()
+
+
+def rebuild(session: Session) -> int:
+    """Recomputes every rollup row from `residuo`. Does not commit. Returns the number of rollup rows."""
+    mes = month_expression(Residuo.fecha_registro, session.get_bind().dialect.name)
+    keys = [func.coalesce(getattr(Residuo, c), literal_column("''")) for c in KEY_COLUMNS]
+    source = select(
+        mes,
+        *keys,
+        func.count(Residuo.id),
+        *(func.coalesce(func.sum(getattr(Residuo, c)), 0.0) for c in SUM_COLUMNS),
+    ).group_by(mes, *keys)
+    session.execute(delete(ResiduoRollup))
+    session.execute(insert(ResiduoRollup).from_select(["mes", *KEY_COLUMNS, "registros", *SUM_COLUMNS], source))
+    return session.exec(select(func.count(ResiduoRollup.id))).one()
+
+
+def can_serve(filters: ResiduoFilters) -> bool:
+    """Rollups answer a query only when every filter maps onto their key: whole months, no unidad_generadora."""
+    if not ROLLUPS_ENABLED or filters.unidad_generadora:
+        return False
+    if filters.fecha_desde and filters.fecha_desde.day != 1:
+        return False
+    if filters.fecha_hasta and (filters.fecha_hasta + timedelta(days=1)).day != 1:
+        return False
+    return True
+
+
+def apply_filters(statement, filters: ResiduoFilters):
+    if filters.fecha_desde:
+        statement = statement.where(ResiduoRollup.mes >= filters.fecha_desde.strftime("%Y-%m"))
+    if filters.fecha_hasta:
+        statement = statement.where(ResiduoRollup.mes <= filters.fecha_hasta.strftime("%Y-%m"))
+    for field in ("tipo_residuo", "codigo_basilea", "razon_social", "planta"):
+        value = getattr(filters, field)
+        if value:
+            statement = statement.where(getattr(ResiduoRollup, field) == value)
+    return statement
@@ -0,0 +1,130 @@
+import os
+import re
+import html
+from sqlalchemy import text
+from sqlmodel import Session
+from dotenv import load_dotenv
+from models import SearchHit
+
+load_dotenv()
+
+# Full-text search over the registry (GET /waste/search).
+# SQLite: an external-content FTS5 table, kept in sync with residuo by triggers.
+# Postgres: a generated tsvector column (Spanish configuration) with a GIN index.
+# Either way the index is maintained by the database itself, so single inserts,
+# /save-batch bulk inserts and backfills are all covered without extra writes here.
+# create_index() is applied by utils/migrations.py.
+SEARCH_COLUMNS = ("tipo_residuo", "caracteristica", "analysis_material_name", "oportunidades_ec")
+SEARCH_SNIPPET_WORDS = int(os.getenv("SEARCH_SNIPPET_WORDS", "12"))
+HIGHLIGHT_START, HIGHLIGHT_STOP = "<mark>", "</mark>"
+# The database highlights with control characters that never occur in the
+# registry text; the snippet is HTML-escaped before they become <mark> tags.
+SENTINEL_START, SENTINEL_STOP = "\x02", "\x03"
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def _create_sqlite_index(conn):
+    columns = ", ".join(SEARCH_COLUMNS)
+    new_values = ", ".join(f"new.{c}" for c in SEARCH_COLUMNS)
+    old_values = ", ".join(f"old.{c}" for c in SEARCH_COLUMNS)
+    statements = [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS residuo_fts USING fts5({columns}, "
+        "content='residuo', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        "CREATE TRIGGER IF NOT EXISTS residuo_fts_insert AFTER INSERT ON residuo BEGIN "
+        f"INSERT INTO residuo_fts(rowid, {columns}) VALUES (new.id, {new_values}); END",
+        "CREATE TRIGGER IF NOT EXISTS residuo_fts_delete AFTER DELETE ON residuo BEGIN "
+        f"INSERT INTO residuo_fts(residuo_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END",
+        "CREATE TRIGGER IF NOT EXISTS residuo_fts_update AFTER UPDATE ON residuo BEGIN "
+        f"INSERT INTO residuo_fts(residuo_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO residuo_fts(rowid, {columns}) VALUES (new.id, {new_values}); END",
+        # Index the rows that existed before the triggers
+        "INSERT INTO residuo_fts(residuo_fts) VALUES ('rebuild')",
+    ]
+    for statement in statements:
+        conn.execute(text(statement))
+
+
+def _create_postgres_index(conn):
+    # Material name and description weigh more than the waste type and the opportunities text
+    weights = {"caracteristica": "A", "analysis_material_name": "A", "tipo_residuo": "B", "oportunidades_ec": "C"}
+    vector = " || ".join(
+        f"setweight(to_tsvector('spanish', coalesce({column}, '')), '{weights[column]}')" for column in SEARCH_COLUMNS
+    )
+    conn.execute(text(
+        f"ALTER TABLE residuo ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ({vector}) STORED"
+    ))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_residuo_search_vector ON residuo USING GIN (search_vector)"))
+
+
+def create_index(conn):
+    if conn.dialect.name == "postgresql":
+        _create_postgres_index(conn)
+    elif conn.dialect.name == "sqlite":
+        _create_sqlite_index(conn)
+    else:
+        print(f"Search: no full-text index for {conn.dialect.name}")
+
+
+def fts5_query(query: str) -> str | None:
+    """FTS5 MATCH expression for free text: every word must appear, the last one as a prefix."""
+    tokens = TOKEN_PATTERN.findall(query)
+    if not tokens:
+        return None
+    terms = [f'"{token}"' for token in tokens]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def highlight(snippet: str | None) -> str | None:
+    """Escapes a database snippet and turns its sentinels into <mark> tags."""
+    if snippet is None:
+        return None
+    return html.escape(snippet).replace(SENTINEL_START, HIGHLIGHT_START).replace(SENTINEL_STOP, HIGHLIGHT_STOP)
+
+
+def _hit(row) -> SearchHit:
+    return SearchHit.model_validate({**row, "snippet": highlight(row["snippet"])})
+
+
+def _search_sqlite(session: Session, query: str, limit: int) -> list[SearchHit]:
+    match = fts5_query(query)
+    if match is None:
+        return []
+    rows = session.execute(text(
+        "SELECT r.id, r.fecha_registro, r.razon_social, r.tipo_residuo, r.caracteristica, r.analysis_material_name, "
+        "-bm25(residuo_fts, 1.0, 2.0, 2.0, 0.5) AS rank, "
+        "snippet(residuo_fts, -1, :start, :stop, '…', :words) AS snippet "
+        "FROM residuo_fts JOIN residuo r ON r.id = residuo_fts.rowid "
+        "WHERE residuo_fts MATCH :match ORDER BY bm25(residuo_fts, 1.0, 2.0, 2.0, 0.5) LIMIT :limit"
+    ), {
+        "match": match, "start": SENTINEL_START, "stop": SENTINEL_STOP,
+        "words": SEARCH_SNIPPET_WORDS, "limit": limit,
+    }).mappings()
+    return [_hit(row) for row in rows]
+
+
+def _search_postgres(session: Session, query: str, limit: int) -> list[SearchHit]:
+    # Rank and limit first; ts_headline re-parses the text, so it only runs on the page
+    document = " || ' ' || ".join(f"coalesce(r.{column}, '')" for column in SEARCH_COLUMNS)
+    rows = session.execute(text(
+        "WITH q AS (SELECT websearch_to_tsquery('spanish', :query) AS query), "
+        "hits AS ("
+        "SELECT r.*, ts_rank_cd(r.search_vector, q.query) AS rank FROM residuo r, q "
+        "WHERE r.search_vector @@ q.query ORDER BY rank DESC, r.id DESC LIMIT :limit) "
+        "SELECT r.id, r.fecha_registro, r.razon_social, r.tipo_residuo, r.caracteristica, r.analysis_material_name, r.rank, "
+        f"ts_headline('spanish', {document}, q.query, :options) AS snippet "
+        "FROM hits r, q ORDER BY r.rank DESC, r.id DESC"
+    ), {
+        "query": query, "limit": limit,
+        "options": f'StartSel="{SENTINEL_START}", StopSel="{SENTINEL_STOP}", '
+                   f"MaxWords={SEARCH_SNIPPET_WORDS}, MinWords={max(SEARCH_SNIPPET_WORDS // 2, 1)}",
+    }).mappings()
+    return [_hit(row) for row in rows]
+
+
+def search(session: Session, query: str, limit: int = 20) -> list[SearchHit]:
+    """Registry rows matching `query`, best match first, with a highlighted snippet."""
+    if session.get_bind().dialect.name == "postgresql":
+        return _search_postgres(session, query, limit)
+    return _search_sqlite(session, query, limit)
@@ -0,0 +1,220 @@
+import os
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Callable
+
+# Two-tier key/value store shared by the LLM, report and photo-hash caches.
+# Memory tier: LRU bounded by entries and/or bytes. Disk tier: a small SQLite
+# file bounded the same way, so entries survive restarts. An optional TTL
+# applies to both tiers. Values go through `encode`/`decode` (str or bytes on disk).
+PRUNE_EVERY_WRITES = 100
+
+
+class TieredCache:
+    def __init__(
+        self,
+        name: str,
+        path: str | None,
+        table: str,
+        *,
+        encode: Callable = lambda value: value,
+        decode: Callable = lambda stored: stored,
+        ttl_seconds: float | None = None,
+        max_entries: int | None = None,
+        max_bytes: int | None = None,
+        disk_max_entries: int | None = None,
+        disk_max_bytes: int | None = None,
+    ):
+        self.name = name
+        self.table = table
+        self.encode = encode
+        self.decode = decode
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_max_entries = disk_max_entries
+        self.disk_max_bytes = disk_max_bytes
+        self._memory: OrderedDict[str, tuple[float | None, object, int]] = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._disk_bytes = 0
+        self._disk_entries = 0
+        self._writes_since_prune = 0
+        self.hits = 0
+        self.misses = 0
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self._conn = sqlite3.connect(path, check_same_thread=False)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._create_table()
+                self._disk_entries, self._disk_bytes = self._conn.execute(
+                    f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {table}"
+                ).fetchone()
+            except Exception as e:
+                print(f"{name}: disk backend unavailable ({e}), using memory only")
+                self._conn = None
+
+    def _create_table(self):
+        columns = {row[1] for row in self._conn.execute(f"PRAGMA table_info({self.table})")}
+        if columns and not {"key", "value"} <= columns:
+            # Written by an older layout; it's a cache, start over
+            self._conn.execute(f"DROP TABLE {self.table}")
+            columns = set()
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL DEFAULT 0, "
+            "expires_at REAL, last_access REAL NOT NULL)"
+        )
+        if columns and "size" not in columns:
+            self._conn.execute(f"ALTER TABLE {self.table} ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+            self._conn.execute(f"UPDATE {self.table} SET size = LENGTH(value)")
+        if columns and "expires_at" not in columns:
+            self._conn.execute(f"ALTER TABLE {self.table} ADD COLUMN expires_at REAL")
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{self.table}_last_access ON {self.table} (last_access)")
+        self._conn.commit()
+
+    def _expires_at(self, now: float) -> float | None:
+        return now + self.ttl_seconds if self.ttl_seconds else None
+
+    def _remember(self, key: str, expires_at: float | None, value, size: int):
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        self._forget(key)
+        self._memory[key] = (expires_at, value, size)
+        self._memory_bytes += size
+        while (self.max_entries is not None and len(self._memory) > self.max_entries) or (
+            self.max_bytes is not None and self._memory_bytes > self.max_bytes
+        ):
+            _, (_, _, evicted_size) = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted_size
+
+    def _forget(self, key: str):
+        entry = self._memory.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= entry[2]
+
+    def get(self, key: str):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[0] is None or entry[0] > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                self._forget(key)
+
+            if self._conn is not None:
+                try:
+                    row = self._conn.execute(
+                        f"SELECT value, expires_at, size FROM {self.table} WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row and (row[1] is None or row[1] > now):
+                        value = self.decode(row[0])
+                        self._conn.execute(f"UPDATE {self.table} SET last_access = ? WHERE key = ?", (now, key))
+                        self._conn.commit()
+                        self._remember(key, row[1], value, row[2])
+                        self.hits += 1
+                        return value
+                    if row:
+                        self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                        self._disk_bytes -= row[2]
+                        self._disk_entries -= 1
+                        self._conn.commit()
+                except Exception as e:
+                    print(f"{self.name}: disk read failed: {e}")
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value):
+        now = time.time()
+        expires_at = self._expires_at(now)
+        stored = self.encode(value)
+        size = len(stored)
+        with self._lock:
+            self._remember(key, expires_at, value, size)
+            if self._conn is None or (self.disk_max_bytes is not None and size > self.disk_max_bytes):
+                return
+            try:
+                previous = self._conn.execute(f"SELECT size FROM {self.table} WHERE key = ?", (key,)).fetchone()
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, size, expires_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (key, stored, size, expires_at, now),
+                )
+                self._disk_bytes += size - (previous[0] if previous else 0)
+                self._disk_entries += 0 if previous else 1
+                self._writes_since_prune += 1
+                over_bytes = self.disk_max_bytes is not None and self._disk_bytes > self.disk_max_bytes
+                over_entries = self.disk_max_entries is not None and self._disk_entries > self.disk_max_entries
+                if over_bytes or over_entries or self._writes_since_prune >= PRUNE_EVERY_WRITES:
+                    self._prune(now)
+                self._conn.commit()
+            except Exception as e:
+                print(f"{self.name}: disk write failed: {e}")
+
+    def _prune(self, now: float):
+        # Drop expired rows, then the least recently used ones above the disk budgets
+        self._writes_since_prune = 0
+        self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        if self.disk_max_entries is not None:
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN ("
+                f"SELECT key FROM {self.table} ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.disk_max_entries,),
+            )
+        self._disk_entries, self._disk_bytes = self._conn.execute(
+            f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {self.table}"
+        ).fetchone()
+        if self.disk_max_bytes is not None and self._disk_bytes > self.disk_max_bytes:
+            rows = self._conn.execute(f"SELECT key, size FROM {self.table} ORDER BY last_access").fetchall()
+            for key, size in rows:
+                if self._disk_bytes <= self.disk_max_bytes:
+                    break
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._disk_bytes -= size
+                self._disk_entries -= 1
+
+    def keys(self) -> list[str]:
+        """Keys of every live entry in either tier."""
+        now = time.time()
+        with self._lock:
+            keys = {key for key, entry in self._memory.items() if entry[0] is None or entry[0] > now}
+            if self._conn is not None:
+                try:
+                    keys.update(key for (key,) in self._conn.execute(
+                        f"SELECT key FROM {self.table} WHERE expires_at IS NULL OR expires_at > ?", (now,)
+                    ).fetchall())
+                except Exception as e:
+                    print(f"{self.name}: disk read failed: {e}")
+            return sorted(keys)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": True,
+            "memory_entries": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "disk_entries": self._disk_entries,
+            "disk_bytes": self._disk_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "persistent": self._conn is not None,
+        }
+
+
+class DisabledCache:
+    def get(self, key: str):
+        return None
+
+    def set(self, key: str, value):
+        pass
+
+    def keys(self) -> list[str]:
+        return []
+
+    def stats(self) -> dict:
+        return {"enabled": False}